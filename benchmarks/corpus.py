@@ -0,0 +1,90 @@
+import os
+import random
+import zipfile
+from typing import List, NamedTuple, Optional
+
+ASCII_WORDS = (
+    "the", "of", "and", "a", "to", "in", "was", "he", "she", "it", "that", "his", "her", "with", "for", "as",
+    "had", "you", "not", "on", "at", "but", "by", "from", "they", "ship", "whale", "sea", "captain", "night",
+    "morning", "letter", "house", "garden", "river", "mountain", "silence", "window", "journey", "promise",
+)
+NON_ASCII_WORDS = (
+    "café", "naïve", "façade", "über", "señor", "smørrebrød", "Ωmega", "Привет", "мир", "東京", "漢字",
+    "こんにちは", "서울", "مرحبا", "שלום", "Ελλάδα", "Zürich", "crème", "brûlée", "jalapeño",
+)
+
+
+class CorpusConfig(NamedTuple):
+    chapters: int = 40
+    paragraphs_per_chapter: int = 30
+    sentences_per_paragraph: int = 5
+    words_per_sentence: int = 14
+    non_ascii_ratio: float = 0.05
+    images: int = 0
+    image_size: int = 64 * 1024
+    seed: int = 0
+
+
+def _sentence(rng: random.Random, config: CorpusConfig) -> str:
+    length = max(1, int(rng.gauss(config.words_per_sentence, config.words_per_sentence / 3)))
+    words = [rng.choice(NON_ASCII_WORDS) if rng.random() < config.non_ascii_ratio else rng.choice(ASCII_WORDS)
+             for _ in range(length)]
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + rng.choice('...!?')
+
+
+def _chapter(rng: random.Random, config: CorpusConfig, number: int, images: List[str]) -> str:
+    paragraphs = []
+    for _ in range(config.paragraphs_per_chapter):
+        sentences = ' '.join(_sentence(rng, config) for _ in range(config.sentences_per_paragraph))
+        paragraphs.append(f"<p>{sentences}</p>")
+    if images:
+        paragraphs.insert(len(paragraphs) // 2, f'<p><img src="../images/{rng.choice(images)}" alt="figure"/></p>')
+    body = '\n'.join(paragraphs)
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml">'
+            f'<head><title>Chapter {number}</title><style>p {{ text-indent: 1em; }}</style></head>'
+            f'<body><h1>Chapter {number}</h1>\n{body}\n</body></html>')
+
+
+def generate_epub(path: str, config: CorpusConfig = CorpusConfig(), title: Optional[str] = None,
+                  author: str = "Benchmark Author", language: str = "en") -> str:
+    rng = random.Random(f"{config.seed}:{os.path.basename(path)}")
+    title = title or os.path.splitext(os.path.basename(path))[0]
+    images = [f"image{number}.jpg" for number in range(config.images)]
+    manifest = [f'<item id="chapter{number}" href="text/chapter{number}.xhtml" media-type="application/xhtml+xml"/>'
+                for number in range(config.chapters)]
+    manifest.extend(f'<item id="image{number}" href="images/{name}" media-type="image/jpeg"/>'
+                    for number, name in enumerate(images))
+    spine = ''.join(f'<itemref idref="chapter{number}"/>' for number in range(config.chapters))
+    opf = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="id">'
+           '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+           f'<dc:title>{title}</dc:title><dc:creator>{author}</dc:creator>'
+           f'<dc:date>2024-01-01</dc:date><dc:language>{language}</dc:language><dc:identifier id="id">{title}</dc:identifier>'
+           f'</metadata><manifest>{"".join(manifest)}</manifest><spine>{spine}</spine></package>')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as epub:
+        epub.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        epub.writestr('META-INF/container.xml',
+                      '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                      '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                      '</rootfiles></container>')
+        epub.writestr('OEBPS/content.opf', opf)
+        for number in range(config.chapters):
+            epub.writestr(f'OEBPS/text/chapter{number}.xhtml', _chapter(rng, config, number + 1, images))
+        for name in images:
+            epub.writestr(f'OEBPS/images/{name}', rng.getrandbits(8 * config.image_size).to_bytes(config.image_size, 'little'), compress_type=zipfile.ZIP_STORED)
+    return path
+
+
+def generate_library(directory: str, count: int, config: CorpusConfig = CorpusConfig(),
+                     books_per_directory: Optional[int] = None) -> List[str]:
+    paths = []
+    for number in range(count):
+        subdirectory = directory
+        if books_per_directory:
+            subdirectory = os.path.join(directory, f"shelf{number // books_per_directory:03d}")
+        paths.append(generate_epub(os.path.join(subdirectory, f"book{number:05d}.epub"), config,
+                                   author=f"Author {number % 97}", language=("en", "fr", "de", "ja")[number % 4]))
+    return paths
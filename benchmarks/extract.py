@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import zipfile
+from typing import Dict, List
+
+from epub_reader.book import read_spine
+from epub_reader.extract import EXTRACTORS, extract_text
+from epub_reader.library import walk_epub_files
+
+
+def load_corpus(paths: List[str]) -> List[bytes]:
+    chapters = []
+    for path in paths:
+        epub_paths = [os.path.join(path, name) for name in walk_epub_files(path)] if os.path.isdir(path) else [path]
+        for epub_path in epub_paths:
+            with zipfile.ZipFile(epub_path, 'r') as epub:
+                chapters.extend(epub.read(name) for name in read_spine(epub))
+    return chapters
+
+
+def bench_extractor(name: str, chapters: List[bytes], repeat: int) -> Dict:
+    total_bytes = sum(len(chapter) for chapter in chapters)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for chapter in chapters:
+            extract_text([chapter], name)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for chapter in chapters:
+        extract_text([chapter], name)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(timings)
+    return {
+        "extractor": name,
+        "chapters": len(chapters),
+        "bytes": total_bytes,
+        "seconds": best,
+        "mb_per_second": (total_bytes / 1_000_000) / best if best else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.extract", description="Compare HTML-to-text extraction backends on a corpus of EPUB files.")
+    parser.add_argument("paths", nargs="+", help="EPUB files or directories of EPUB files")
+    parser.add_argument("-e", "--extractor", action="append", choices=sorted(EXTRACTORS), help="backend to measure (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per backend; the best one is reported")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    chapters = load_corpus(args.paths)
+    results = [bench_extractor(name, chapters, args.repeat) for name in args.extractor or sorted(EXTRACTORS)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'extractor':<10} {'MB/s':>10} {'seconds':>10} {'peak MiB':>10}")
+    for result in results:
+        print(f"{result['extractor']:<10} {result['mb_per_second']:>10.2f} {result['seconds']:>10.3f} "
+              f"{result['peak_memory_bytes'] / (1024 * 1024):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
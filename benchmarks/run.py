@@ -0,0 +1,217 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.corpus import CorpusConfig, generate_epub, generate_library
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def register(function: Callable) -> Callable:
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: List[float], units: float = 0.0, unit: str = "") -> Dict:
+    summary = {
+        "runs": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p90_ms": percentile(samples, 0.90) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+    if units and unit:
+        summary[f"{unit}_per_second"] = units / statistics.median(samples)
+    return summary
+
+
+def timed(function: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextlib.contextmanager
+def silenced():
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+            os.close(saved)
+
+
+@benchmark("scan")
+def bench_scan(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import get_epub_files_with_metadata
+    directory = corpus["library"]
+    count = len(get_epub_files_with_metadata(directory))
+    return summarize(timed(lambda: get_epub_files_with_metadata(directory), repeat), count, "books")
+
+
+@benchmark("metadata")
+def bench_metadata(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import read_epub_metadata
+    return summarize(timed(lambda: read_epub_metadata(corpus["book"]), repeat), 1, "books")
+
+
+@benchmark("pages")
+def bench_pages(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import read_epub_pages
+    size = os.path.getsize(corpus["book"]) / 1_000_000
+    return summarize(timed(lambda: read_epub_pages(corpus["book"]), repeat), size, "mb")
+
+
+@benchmark("search")
+def bench_search(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import read_epub_pages, search_text
+    pages = read_epub_pages(corpus["book"])
+    size = sum(len(page) for page in pages) / 1_000_000
+    return summarize(timed(lambda: search_text(pages, "captain"), repeat), size, "mb")
+
+
+@benchmark("page_turn")
+def bench_page_turn(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader import main as reader
+    pages = reader.read_epub_pages(corpus["book"])
+    reader.book_title, reader.book_author = "Benchmark", "Author"
+    positions = [(page, offset) for page in range(len(pages))
+                 for offset in range(0, len(pages[page].split('\n')), reader.LINES_PER_SCREEN)]
+    samples = []
+    with silenced():
+        for run in range(repeat):
+            page, offset = positions[run % len(positions)]
+            start = time.perf_counter()
+            reader.display_page(pages, page, offset, lines_per_screen=reader.LINES_PER_SCREEN)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples, 1, "pages")
+
+
+@benchmark("save_book")
+def bench_save_book(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import read_epub_pages, save_book
+    pages = read_epub_pages(corpus["book"])
+    size = sum(len(page.encode('utf-8')) for page in pages) / 1_000_000
+    with tempfile.TemporaryDirectory() as directory, silenced():
+        os.chdir(directory)
+        samples = timed(lambda: save_book(pages, "Benchmark", "Author"), repeat)
+    return summarize(samples, size, "mb")
+
+
+@benchmark("session")
+def bench_session(corpus: Dict, repeat: int) -> Dict:
+    from epub_reader.main import load_reading_session, save_reading_session
+    os.makedirs(os.path.join(os.path.expanduser("~"), ".epub_reader"), exist_ok=True)
+    bookmarks = [(page, page * 1.5) for page in range(50)]
+    history = [f"query {number}" for number in range(50)]
+    save = timed(lambda: save_reading_session("benchmark", 3, 40, 12.5, bookmarks, history), repeat)
+    load = timed(lambda: load_reading_session("benchmark"), repeat)
+    return {"save": summarize(save, 1, "sessions"), "load": summarize(load, 1, "sessions")}
+
+
+def _run_one(name: str, corpus: Dict, repeat: int, home: str, queue) -> None:
+    os.environ["HOME"] = home
+    try:
+        result = BENCHMARKS[name](corpus, repeat)
+    except Exception as error:
+        result = {"error": f"{type(error).__name__}: {error}"}
+    try:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    except ImportError:
+        result["peak_rss_bytes"] = None
+    queue.put(result)
+
+
+def run_isolated(name: str, corpus: Dict, repeat: int) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    with tempfile.TemporaryDirectory() as home:
+        process = context.Process(target=_run_one, args=(name, corpus, repeat, home, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+    return result
+
+
+def build_corpus(directory: str, config: CorpusConfig, library_size: int) -> Dict:
+    book = os.path.join(directory, "book.epub")
+    if not os.path.exists(book):
+        generate_epub(book, config, title="Benchmark Book")
+    library = os.path.join(directory, "library")
+    if not os.path.isdir(library):
+        generate_library(library, library_size, config._replace(chapters=max(1, config.chapters // 10), images=0))
+    return {"book": book, "library": library}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    defaults = CorpusConfig()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Time the reader's entry points on a synthetic EPUB corpus.")
+    parser.add_argument("-b", "--benchmark", action="append", choices=sorted(BENCHMARKS), help="benchmark to run (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="timed runs per benchmark")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--corpus-dir", help="reuse or create the corpus in this directory")
+    parser.add_argument("--chapters", type=int, default=defaults.chapters)
+    parser.add_argument("--paragraphs", type=int, default=defaults.paragraphs_per_chapter, help="paragraphs per chapter")
+    parser.add_argument("--sentences", type=int, default=defaults.sentences_per_paragraph, help="sentences per paragraph")
+    parser.add_argument("--words", type=int, default=defaults.words_per_sentence, help="average words per sentence")
+    parser.add_argument("--non-ascii", type=float, default=defaults.non_ascii_ratio, help="fraction of non-ASCII words")
+    parser.add_argument("--images", type=int, default=defaults.images, help="images embedded in the book")
+    parser.add_argument("--image-size", type=int, default=defaults.image_size, help="bytes per image")
+    parser.add_argument("--library-size", type=int, default=200, help="number of books in the scanned library")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+
+    config = CorpusConfig(args.chapters, args.paragraphs, args.sentences, args.words, args.non_ascii,
+                          args.images, args.image_size, args.seed)
+    with contextlib.ExitStack() as stack:
+        directory = args.corpus_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="epub-bench-"))
+        corpus = build_corpus(os.path.abspath(directory), config, args.library_size)
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": dict(config._asdict(), library_size=args.library_size,
+                           book_bytes=os.path.getsize(corpus["book"])),
+            "results": {name: run_isolated(name, corpus, args.repeat) for name in args.benchmark or BENCHMARKS},
+        }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
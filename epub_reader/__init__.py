@@ -0,0 +1,3 @@
+from epub_reader.api import EpubBook, Library
+
+__all__ = ['EpubBook', 'Library']
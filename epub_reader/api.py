@@ -0,0 +1,209 @@
+import os
+import re
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from epub_reader.archive import DEFAULT_MEMORY_LIMIT, EpubArchive
+from epub_reader.book import LazyBook, parse_opf_metadata, read_opf, read_spine
+from epub_reader.library import expand_epub_paths, imap_bounded
+
+_WORD_RE = re.compile(r'\w+')
+
+
+class EpubBook:
+    def __init__(self, path: str, extractor: Optional[str] = None, cache_size: int = 8,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+        self.path = path
+        self.extractor = extractor
+        self.cache_size = cache_size
+        self.memory_limit = memory_limit
+        self._metadata: Optional[Dict[str, Any]] = None
+        self._archive: Optional[EpubArchive] = None
+        self._pages: Optional[LazyBook] = None
+
+    def __enter__(self) -> 'EpubBook':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"EpubBook({self.path!r})"
+
+    def close(self) -> None:
+        if self._pages is not None:
+            self._pages.close()
+        elif self._archive is not None:
+            self._archive.close()
+        self._pages = self._archive = None
+
+    @property
+    def archive(self) -> EpubArchive:
+        if self._archive is None:
+            self._archive = EpubArchive(self.path, memory_limit=self.memory_limit)
+        return self._archive
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            epub = self.archive.zip
+            opf_path, content = read_opf(epub)
+            chapters = read_spine(epub, opf_path, content)
+            fingerprint = self.archive.fingerprint
+            title, author, date, language = parse_opf_metadata(content)
+            self._metadata = {
+                "path": self.path,
+                "title": title,
+                "author": author,
+                "date": date,
+                "language": language,
+                "pages": len(chapters),
+                "chapters": chapters,
+                "opf": opf_path,
+                "size": os.path.getsize(self.path),
+                "fingerprint": fingerprint,
+            }
+        return self._metadata
+
+    @property
+    def title(self) -> str:
+        return self.metadata["title"]
+
+    @property
+    def author(self) -> str:
+        return self.metadata["author"]
+
+    @property
+    def date(self) -> str:
+        return self.metadata["date"]
+
+    @property
+    def language(self) -> str:
+        return self.metadata["language"]
+
+    @property
+    def page_count(self) -> int:
+        return self.metadata["pages"]
+
+    @property
+    def pages(self) -> LazyBook:
+        if self._pages is None:
+            self._pages = LazyBook(self.path, cache_size=self.cache_size, prefetch=False, extractor=self.extractor,
+                                   archive=self.archive, memory_limit=self.memory_limit)
+        return self._pages
+
+    @property
+    def text(self) -> str:
+        return '\n\n'.join(self.pages)
+
+    def summary(self) -> Dict[str, Any]:
+        return {key: self.metadata[key] for key in ("path", "title", "author", "date", "language", "pages")}
+
+    def search(self, query: str, max_hits: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        hits = 0
+        for page_number, page in enumerate(self.pages):
+            if not pattern.search(page):
+                continue
+            for sentence in page.split('\n'):
+                if pattern.search(sentence):
+                    yield page_number, sentence
+                    hits += 1
+                    if max_hits is not None and hits >= max_hits:
+                        return
+
+    def stats(self) -> Dict[str, Any]:
+        sentences = words = characters = 0
+        for page in self.pages:
+            for sentence in page.split('\n'):
+                if sentence:
+                    sentences += 1
+                    words += len(_WORD_RE.findall(sentence))
+                    characters += len(sentence)
+        return dict(self.summary(), sentences=sentences, words=words, characters=characters,
+                    bytes=self.metadata["size"])
+
+
+def _book_metadata(path: str, memory_limit: int) -> Dict[str, Any]:
+    with EpubBook(path, memory_limit=memory_limit) as book:
+        return book.metadata
+
+
+def _book_summary(path: str, memory_limit: int) -> Dict[str, Any]:
+    with EpubBook(path, memory_limit=memory_limit) as book:
+        return book.summary()
+
+
+def _book_text(path: str, memory_limit: int) -> Dict[str, Any]:
+    with EpubBook(path, memory_limit=memory_limit) as book:
+        return dict(book.summary(), text=list(book.pages))
+
+
+def _book_search(path: str, memory_limit: int, query: str, max_hits: Optional[int]) -> Dict[str, Any]:
+    with EpubBook(path, memory_limit=memory_limit) as book:
+        hits = [{"page": page_number, "sentence": sentence} for page_number, sentence in book.search(query, max_hits)]
+    return {"path": path, "hits": hits}
+
+
+def _book_stats(path: str, memory_limit: int) -> Dict[str, Any]:
+    with EpubBook(path, memory_limit=memory_limit) as book:
+        return book.stats()
+
+
+def _safely(function: Callable[..., Dict[str, Any]], path: str, *args) -> Dict[str, Any]:
+    try:
+        return function(path, *args)
+    except (zipfile.BadZipFile, OSError, KeyError, ValueError) as error:
+        return {"path": path, "error": f"{type(error).__name__}: {error}"}
+
+
+class Library:
+    def __init__(self, paths, recursive: bool = True, workers: Optional[int] = None,
+                 use_processes: bool = True, max_pending: Optional[int] = None, ordered: bool = False,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.recursive = recursive
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.max_pending = max_pending or 4 * self.workers
+        self.ordered = ordered
+        self.memory_limit = memory_limit
+        self._files: Optional[List[str]] = None
+
+    @property
+    def files(self) -> List[str]:
+        if self._files is None:
+            self._files = [path for path, _ in expand_epub_paths(self.paths, self.recursive)]
+        return self._files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter__(self) -> Iterator[EpubBook]:
+        return (EpubBook(path, memory_limit=self.memory_limit) for path in self.files)
+
+    def _executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def map(self, function: Callable[..., Dict[str, Any]], *args) -> Iterator[Dict[str, Any]]:
+        with self._executor() as executor:
+            items = ((function, path, self.memory_limit) + args for path in self.files)
+            yield from imap_bounded(executor, _safely, items, self.max_pending, self.ordered)
+
+    def scan(self) -> Iterator[Dict[str, Any]]:
+        return self.map(_book_summary)
+
+    def metadata(self) -> Iterator[Dict[str, Any]]:
+        return self.map(_book_metadata)
+
+    def texts(self) -> Iterator[Dict[str, Any]]:
+        return self.map(_book_text)
+
+    def search(self, query: str, max_hits: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        return self.map(_book_search, query, max_hits)
+
+    def stats(self) -> Iterator[Dict[str, Any]]:
+        return self.map(_book_stats)
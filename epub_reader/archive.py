@@ -0,0 +1,113 @@
+import mmap
+import zipfile
+from typing import Any, Dict, Iterator, Optional
+
+from epub_reader import profiling
+from epub_reader.cache import archive_fingerprint
+
+CHUNK_SIZE = 256 * 1024
+STREAM_THRESHOLD = 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+
+class EntryTooLargeError(ValueError):
+    pass
+
+
+class _MappedFile:
+    def __init__(self, mapping: mmap.mmap, name: str) -> None:
+        self.mapping = mapping
+        self.name = name
+
+    def read(self, size: int = -1) -> bytes:
+        return self.mapping.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.mapping.seek(offset, whence)
+        return self.mapping.tell()
+
+    def tell(self) -> int:
+        return self.mapping.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+
+class EpubArchive:
+    def __init__(self, path: str, use_mmap: bool = False, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 chunk_size: int = CHUNK_SIZE) -> None:
+        self.path = path
+        self.memory_limit = memory_limit
+        self.chunk_size = chunk_size
+        self._map: Optional[mmap.mmap] = None
+        self._fingerprint: Optional[str] = None
+        with profiling.span("archive_open"):
+            self._file = open(path, 'rb')
+            try:
+                source: Any = self._file
+                if use_mmap:
+                    try:
+                        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                        source = _MappedFile(self._map, path)
+                    except (OSError, ValueError):
+                        self._map = None
+                self.zip = zipfile.ZipFile(source, 'r')
+            except BaseException:
+                self._close_source()
+                raise
+        self.entries: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in self.zip.infolist() if not info.filename.endswith('/')
+        }
+
+    def __enter__(self) -> 'EpubArchive':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = archive_fingerprint(self.zip)
+        return self._fingerprint
+
+    def _info(self, name: str) -> zipfile.ZipInfo:
+        info = self.entries.get(name)
+        if info is None:
+            raise KeyError(f"There is no item named '{name}' in the archive")
+        if self.memory_limit and info.file_size > self.memory_limit:
+            raise EntryTooLargeError(f"'{name}' is {info.file_size} bytes uncompressed, "
+                                     f"above the {self.memory_limit} byte memory limit")
+        return info
+
+    def read(self, name: str) -> bytes:
+        data = self.zip.read(self._info(name))
+        profiling.count("bytes_decompressed", len(data))
+        return data
+
+    def iter_chunks(self, name: str) -> Iterator[bytes]:
+        info = self._info(name)
+        if info.file_size <= STREAM_THRESHOLD:
+            yield self.read(name)
+            return
+        total = 0
+        with self.zip.open(info) as entry:
+            while True:
+                chunk = entry.read(self.chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if self.memory_limit and total > self.memory_limit:
+                    raise EntryTooLargeError(f"'{name}' exceeds the {self.memory_limit} byte memory limit")
+                profiling.count("bytes_decompressed", len(chunk))
+                yield chunk
+
+    def _close_source(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def close(self) -> None:
+        self.zip.close()
+        self._close_source()
@@ -0,0 +1,333 @@
+import bisect
+import posixpath
+import re
+import threading
+import zipfile
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence as SequenceType, Tuple
+from urllib.parse import unquote
+
+from epub_reader import profiling
+from epub_reader.archive import DEFAULT_MEMORY_LIMIT, EntryTooLargeError, EpubArchive
+from epub_reader.cache import DEFAULT_CACHE_LIMIT, ChapterCache
+from epub_reader.extract import extract_text, resolve_extractor
+
+HTML_EXTENSIONS = ('.html', '.xhtml')
+CONTAINER_PATH = 'META-INF/container.xml'
+
+_ATTRIBUTE_RE = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_ROOTFILE_RE = re.compile(r'<(?:\w+:)?rootfile\b([^>]*)>')
+_ITEM_RE = re.compile(r'<(?:\w+:)?item\b([^>]*)>')
+_ITEMREF_RE = re.compile(r'<(?:\w+:)?itemref\b([^>]*)>')
+
+
+def _attributes(tag_body: str) -> Dict[str, str]:
+    return {name: double or single for name, double, single in _ATTRIBUTE_RE.findall(tag_body)}
+
+
+def find_opf_path(epub: zipfile.ZipFile) -> Optional[str]:
+    try:
+        container = epub.read(CONTAINER_PATH).decode('utf-8', errors='replace')
+    except KeyError:
+        container = ''
+    for match in _ROOTFILE_RE.finditer(container):
+        full_path = _attributes(match.group(1)).get('full-path')
+        if full_path:
+            try:
+                epub.getinfo(full_path)
+                return full_path
+            except KeyError:
+                pass
+    for name in epub.namelist():
+        if name.endswith('.opf'):
+            return name
+    return None
+
+
+def parse_opf_metadata(opf_content: str) -> Tuple[str, str, str, str]:
+    title_search = re.search(r'<dc:title[^>]*>(.*?)</dc:title>', opf_content)
+    author_search = re.search(r'<dc:creator[^>]*>(.*?)</dc:creator>', opf_content)
+    date_search = re.search(r'<dc:date[^>]*>(.*?)</dc:date>', opf_content)
+    language_search = re.search(r'<dc:language[^>]*>(.*?)</dc:language>', opf_content)
+    title = title_search.group(1) if title_search else 'Unknown Title'
+    author = author_search.group(1) if author_search else 'Unknown Author'
+    publication_date = date_search.group(1) if date_search else 'Unknown Date'
+    language = language_search.group(1) if language_search else 'Unknown Language'
+    return title, author, publication_date, language
+
+
+def read_opf(epub: zipfile.ZipFile) -> Tuple[Optional[str], str]:
+    with profiling.span("opf_lookup"):
+        opf_path = find_opf_path(epub)
+        if opf_path is None:
+            return None, ''
+        return opf_path, epub.read(opf_path).decode('utf-8', errors='replace')
+
+
+def read_spine(epub: zipfile.ZipFile, opf_path: Optional[str] = None, opf_content: Optional[str] = None) -> List[str]:
+    names = epub.namelist()
+    if opf_path is None:
+        opf_path = find_opf_path(epub)
+    if opf_path is not None:
+        if opf_content is None:
+            opf_content = epub.read(opf_path).decode('utf-8', errors='replace')
+        spine = spine_from_opf(opf_content, opf_path, set(names))
+        if spine:
+            return spine
+    return sorted(name for name in names if name.endswith(HTML_EXTENSIONS))
+
+
+def skipped_chapter(error: EntryTooLargeError) -> Tuple[Optional[str], str]:
+    return None, f"[Chapter skipped: {error}]"
+
+
+def legacy_page_map(names: List[str], chapters: List[str]) -> Dict[int, int]:
+    positions = {name: index for index, name in enumerate(chapters)}
+    legacy = sorted(name for name in names if name.endswith(HTML_EXTENSIONS))
+    page_map: Dict[int, int] = {}
+    following = max(0, len(chapters) - 1)
+    for page_number in range(len(legacy) - 1, -1, -1):
+        following = positions.get(legacy[page_number], following)
+        page_map[page_number] = following
+    return page_map
+
+
+def spine_from_opf(opf_content: str, opf_path: str, names: set) -> List[str]:
+    base = posixpath.dirname(opf_path)
+    manifest: Dict[str, str] = {}
+    for match in _ITEM_RE.finditer(opf_content):
+        attributes = _attributes(match.group(1))
+        if 'id' in attributes and 'href' in attributes:
+            href = unquote(attributes['href'].split('#', 1)[0])
+            manifest[attributes['id']] = posixpath.normpath(posixpath.join(base, href))
+    spine = []
+    seen = set()
+    for match in _ITEMREF_RE.finditer(opf_content):
+        name = manifest.get(_attributes(match.group(1)).get('idref', ''))
+        if name and name in names and name not in seen and name.endswith(HTML_EXTENSIONS):
+            seen.add(name)
+            spine.append(name)
+    return spine
+
+
+class Page:
+    __slots__ = ('text', 'heading', 'line_starts', 'layouts')
+
+    def __init__(self, text: str, heading: Optional[str] = None) -> None:
+        self.text = text
+        self.heading = heading
+        self.layouts = None
+        self.line_starts = array('L', [0])
+        position = text.find('\n')
+        while position != -1:
+            self.line_starts.append(position + 1)
+            position = text.find('\n', position + 1)
+
+    def __len__(self) -> int:
+        return len(self.line_starts)
+
+    def _line_end(self, line: int) -> int:
+        return self.line_starts[line + 1] - 1 if line + 1 < len(self.line_starts) else len(self.text)
+
+    def line(self, line: int) -> str:
+        return self.text[self.line_starts[line]:self._line_end(line)]
+
+    def line_at(self, offset: int) -> int:
+        return max(0, bisect.bisect_right(self.line_starts, offset) - 1)
+
+    def offset_of(self, line: int) -> int:
+        return self.line_starts[min(max(0, line), len(self.line_starts) - 1)]
+
+    def lines(self, start: int, end: int) -> List[str]:
+        start = max(0, start)
+        end = min(end, len(self.line_starts))
+        if start >= end:
+            return []
+        return self.text[self.line_starts[start]:self._line_end(end - 1)].split('\n')
+
+
+def get_page(pages: SequenceType[str], page_number: int) -> Page:
+    page = getattr(pages, 'page', None)
+    return page(page_number) if page is not None else Page(pages[page_number])
+
+
+def page_text(pages: SequenceType[str], page_number: int) -> str:
+    warm = getattr(pages, 'warm', None)
+    return warm(page_number) if warm is not None else pages[page_number]
+
+
+class LazyBook(Sequence):
+    def __init__(self, epub_path: str, cache_size: int = 32, prefetch: bool = True,
+                 disk_cache: bool = False, disk_cache_limit: int = DEFAULT_CACHE_LIMIT,
+                 extractor: Optional[str] = None, archive: Optional[EpubArchive] = None,
+                 use_mmap: bool = False, memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+        self.epub_path = epub_path
+        self.extractor = resolve_extractor(extractor)
+        self.archive = archive if archive is not None else EpubArchive(epub_path, use_mmap, memory_limit)
+        self._epub = self.archive.zip
+        opf_path, opf_content = read_opf(self._epub)
+        with profiling.span("spine"):
+            self.chapters: List[str] = read_spine(self._epub, opf_path, opf_content)
+        self.metadata = parse_opf_metadata(opf_content)
+        self.fingerprint = self.archive.fingerprint
+        self._disk_cache: Optional[ChapterCache] = None
+        if disk_cache:
+            try:
+                self._disk_cache = ChapterCache.for_archive(self._epub, limit=disk_cache_limit, variant=self.extractor)
+            except OSError:
+                self._disk_cache = None
+        self._cache: 'OrderedDict[int, Page]' = OrderedDict()
+        self._cached_characters = 0
+        self._memory_limit = memory_limit
+        self._line_counts: Dict[int, int] = {}
+        self._line_table: Optional[array] = None
+        self._cache_size = max(1, cache_size)
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='epub-prefetch') if prefetch else None
+
+    def __len__(self) -> int:
+        return len(self.chapters)
+
+    def __getitem__(self, index: int) -> str:
+        return self.page(index).text
+
+    def page(self, index: int, prefetch: bool = True) -> Page:
+        if not isinstance(index, int):
+            raise TypeError(f"chapter indices must be integers, not {type(index).__name__}")
+        if index < 0:
+            index += len(self.chapters)
+        if not 0 <= index < len(self.chapters):
+            raise IndexError("chapter index out of range")
+        page = self._get(index)
+        if prefetch:
+            self.prefetch(index)
+        return page
+
+    def line_count(self, index: int) -> int:
+        count = self._line_counts.get(index)
+        return count if count is not None else len(self.page(index))
+
+    def line_table(self) -> array:
+        if self._line_table is None:
+            table = array('Q', [0])
+            for index in range(len(self.chapters)):
+                count = self._line_counts.get(index)
+                if count is None:
+                    count = self.warm(index).count('\n') + 1
+                table.append(table[-1] + count)
+            self._line_table = table
+        return self._line_table
+
+    def global_line(self, index: int, line: int) -> Optional[int]:
+        if self._line_table is None:
+            return None
+        return self._line_table[index] + line
+
+    def locate(self, global_line: int) -> Tuple[int, int]:
+        table = self.line_table()
+        global_line = min(max(0, global_line), max(0, table[-1] - 1))
+        index = min(bisect.bisect_right(table, global_line) - 1, len(self.chapters) - 1)
+        return index, global_line - table[index]
+
+    def __enter__(self) -> 'LazyBook':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get(self, index: int) -> Page:
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+            pending = self._pending.get(index)
+        if pending is not None:
+            return pending.result()
+        return self._load(index)
+
+    def _read(self, index: int) -> Tuple[Optional[str], str]:
+        cached = self._disk_cache.get(index) if self._disk_cache is not None else None
+        if cached is not None:
+            profiling.count("disk_cache_hits")
+            return cached
+        try:
+            with profiling.span("chapter_parse", {"chapter": index}):
+                heading, text = extract_text(self.archive.iter_chunks(self.chapters[index]), self.extractor)
+        except EntryTooLargeError as error:
+            return skipped_chapter(error)
+        profiling.count("chapters_parsed")
+        if self._disk_cache is not None:
+            self._disk_cache.put(index, heading, text)
+        return heading, text
+
+    def chapter(self, index: int) -> Tuple[Optional[str], str]:
+        with self._lock:
+            page = self._cache.get(index)
+        if page is not None:
+            return page.heading, page.text
+        return self._read(index)
+
+    def warm(self, index: int) -> str:
+        with self._lock:
+            page = self._cache.get(index)
+        if page is not None:
+            return page.text
+        _, text = self._read(index)
+        if index not in self._line_counts:
+            self._line_counts[index] = text.count('\n') + 1
+        return text
+
+    def is_warm(self, index: int) -> bool:
+        with self._lock:
+            if index in self._cache:
+                return True
+        return self._disk_cache is not None and index in self._disk_cache
+
+    def _load(self, index: int) -> Page:
+        heading, text = self._read(index)
+        page = Page(text, heading)
+        with self._lock:
+            previous = self._cache.pop(index, None)
+            if previous is not None:
+                self._cached_characters -= len(previous.text)
+            self._cache[index] = page
+            self._cached_characters += len(text)
+            self._line_counts[index] = len(page)
+            while len(self._cache) > 1 and (len(self._cache) > self._cache_size or
+                                            self._memory_limit and self._cached_characters > self._memory_limit):
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_characters -= len(evicted.text)
+        return page
+
+    def _prefetch_one(self, index: int) -> Page:
+        try:
+            return self._load(index)
+        finally:
+            with self._lock:
+                self._pending.pop(index, None)
+
+    def prefetch(self, index: int) -> None:
+        if self._executor is None:
+            return
+        for neighbor in (index + 1, index - 1):
+            if not 0 <= neighbor < len(self.chapters):
+                continue
+            with self._lock:
+                if neighbor in self._cache or neighbor in self._pending:
+                    continue
+                try:
+                    self._pending[neighbor] = self._executor.submit(self._prefetch_one, neighbor)
+                except RuntimeError:
+                    return
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.archive.close()
+        if self._disk_cache is not None:
+            self._disk_cache.close()
@@ -0,0 +1,126 @@
+import hashlib
+import marshal
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from typing import Dict, Optional, Tuple
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".epub_reader", "cache")
+CACHE_VERSION = 3
+DEFAULT_CACHE_LIMIT = 256 * 1024 * 1024
+
+_MAGIC = b'EPRCACHE' + struct.pack('<I', CACHE_VERSION)
+_RECORD = struct.Struct('<II')
+
+
+def archive_fingerprint(epub: zipfile.ZipFile) -> str:
+    digest = hashlib.sha1()
+    if epub.filename and os.path.exists(epub.filename):
+        digest.update(str(os.path.getsize(epub.filename)).encode())
+    for info in epub.infolist():
+        digest.update(f"{info.filename}\0{info.CRC}\0{info.file_size}\n".encode('utf-8', errors='replace'))
+    return digest.hexdigest()
+
+
+def enforce_cache_limit(cache_dir: str, limit: int, keep: Optional[str] = None) -> None:
+    try:
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.pack'):
+                path = os.path.join(cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class ChapterCache:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[int, Tuple[int, int]] = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            self._file = open(path, 'r+b')
+        except FileNotFoundError:
+            self._file = open(path, 'w+b')
+        self._load_index()
+        os.utime(path)
+
+    @classmethod
+    def for_archive(cls, epub: zipfile.ZipFile, cache_dir: str = CACHE_DIR, limit: int = DEFAULT_CACHE_LIMIT,
+                    variant: str = '') -> 'ChapterCache':
+        name = f"{archive_fingerprint(epub)}-{variant}" if variant else archive_fingerprint(epub)
+        path = os.path.join(cache_dir, f"{name}.pack")
+        cache = cls(path)
+        enforce_cache_limit(cache_dir, limit, keep=path)
+        return cache
+
+    def _load_index(self) -> None:
+        self._file.seek(0)
+        if self._file.read(len(_MAGIC)) != _MAGIC:
+            self._reset()
+            return
+        offset = len(_MAGIC)
+        end = self._file.seek(0, os.SEEK_END)
+        while offset + _RECORD.size <= end:
+            self._file.seek(offset)
+            index, length = _RECORD.unpack(self._file.read(_RECORD.size))
+            if offset + _RECORD.size + length > end:
+                break
+            self._index[index] = (offset + _RECORD.size, length)
+            offset += _RECORD.size + length
+        if offset != end:
+            self._file.truncate(offset)
+
+    def _reset(self) -> None:
+        self._index.clear()
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(_MAGIC)
+        self._file.flush()
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._index
+
+    def get(self, index: int) -> Optional[Tuple[Optional[str], str]]:
+        with self._lock:
+            entry = self._index.get(index)
+            if entry is None or self._file.closed:
+                return None
+            offset, length = entry
+            self._file.seek(offset)
+            data = self._file.read(length)
+        try:
+            heading, text = marshal.loads(zlib.decompress(data))
+        except (zlib.error, ValueError, EOFError, TypeError):
+            return None
+        return heading, text
+
+    def put(self, index: int, heading: Optional[str], text: str) -> None:
+        data = zlib.compress(marshal.dumps((heading, text)), 6)
+        with self._lock:
+            if index in self._index or self._file.closed:
+                return
+            offset = self._file.seek(0, os.SEEK_END)
+            self._file.write(_RECORD.pack(index, len(data)))
+            self._file.write(data)
+            self._file.flush()
+            self._index[index] = (offset + _RECORD.size, len(data))
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
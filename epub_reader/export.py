@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from epub_reader.archive import DEFAULT_MEMORY_LIMIT, EntryTooLargeError, EpubArchive
+from epub_reader.book import LazyBook, parse_opf_metadata, read_opf, read_spine, skipped_chapter
+from epub_reader.extract import extract_text, resolve_extractor
+from epub_reader.library import expand_epub_paths, imap_bounded
+
+EXPORT_FORMATS = {"txt": ".txt", "md": ".md", "jsonl": ".jsonl"}
+JSONL_UNITS = ("chapter", "sentence")
+
+_worker_archive: Optional[EpubArchive] = None
+
+
+def _extract_archive_chapter(epub_path: str, name: str, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                             extractor: Optional[str] = None) -> Tuple[Optional[str], str]:
+    global _worker_archive
+    if _worker_archive is None or _worker_archive.path != epub_path:
+        if _worker_archive is not None:
+            _worker_archive.close()
+        _worker_archive = EpubArchive(epub_path, memory_limit=memory_limit)
+    _worker_archive.memory_limit = memory_limit
+    try:
+        return extract_text(_worker_archive.iter_chunks(name), extractor)
+    except EntryTooLargeError as error:
+        return skipped_chapter(error)
+
+
+def _write_txt(output: TextIO, chapter: int, heading: Optional[str], text: str, **_) -> None:
+    output.write(text + '\n\n')
+
+
+def _write_md(output: TextIO, chapter: int, heading: Optional[str], text: str, **_) -> None:
+    if heading and text.startswith(heading):
+        text = text[len(heading):].lstrip()
+    output.write(f"## {heading or f'Chapter {chapter + 1}'}\n\n{text}\n\n")
+
+
+def _write_jsonl(output: TextIO, chapter: int, heading: Optional[str], text: str, unit: str = "chapter", **_) -> None:
+    if unit == "sentence":
+        for sentence_number, sentence in enumerate(line for line in text.split('\n') if line):
+            output.write(json.dumps({"chapter": chapter, "heading": heading, "sentence": sentence_number, "text": sentence},
+                                    ensure_ascii=False) + '\n')
+    else:
+        output.write(json.dumps({"chapter": chapter, "heading": heading, "text": text}, ensure_ascii=False) + '\n')
+
+
+_WRITERS = {"txt": _write_txt, "md": _write_md, "jsonl": _write_jsonl}
+
+
+def export_book(epub_path: str, output_path: str, fmt: str = "txt", unit: str = "chapter",
+                workers: Optional[int] = None, executor: Optional[Executor] = None,
+                pages: Optional[LazyBook] = None, memory_limit: Optional[int] = None,
+                extractor: Optional[str] = None) -> int:
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}'. Choose one of: {', '.join(EXPORT_FORMATS)}.")
+    if memory_limit is None:
+        memory_limit = pages.archive.memory_limit if pages is not None else DEFAULT_MEMORY_LIMIT
+    extractor = resolve_extractor(extractor if extractor is not None or pages is None else pages.extractor)
+    with EpubArchive(epub_path, memory_limit=memory_limit) as archive:
+        opf_path, content = read_opf(archive.zip)
+        chapters = read_spine(archive.zip, opf_path, content)
+    title, author, _, _ = parse_opf_metadata(content)
+    warm = [pages is not None and pages.extractor == extractor and pages.is_warm(chapter)
+            for chapter in range(len(chapters))]
+    cold = [name for name, is_warm in zip(chapters, warm) if not is_warm]
+    own_executor = executor is None and bool(cold)
+    if own_executor:
+        context = multiprocessing.get_context("spawn") if pages is not None else None
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    window = 2 * (workers or os.cpu_count() or 1)
+    writer = _WRITERS[fmt]
+    try:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            if fmt == "md":
+                output.write(f"# {title}\n\n*{author}*\n\n")
+            results = imap_bounded(executor, _extract_archive_chapter,
+                                   ((epub_path, name, memory_limit, extractor) for name in cold), window)
+            for chapter, is_warm in enumerate(warm):
+                heading, text = pages.chapter(chapter) if is_warm else next(results)
+                writer(output, chapter, heading, text, unit=unit)
+    except BaseException:
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+    return len(chapters)
+
+
+def export_directory(paths: List[str], output_directory: str, fmt: str = "txt", unit: str = "chapter",
+                     workers: Optional[int] = None, recursive: bool = True,
+                     memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                     extractor: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for epub_path, relative_path in expand_epub_paths(paths, recursive):
+            output_path = os.path.join(output_directory, os.path.splitext(relative_path)[0] + EXPORT_FORMATS[fmt])
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            try:
+                chapters = export_book(epub_path, output_path, fmt, unit, workers=workers, executor=executor,
+                                       memory_limit=memory_limit, extractor=extractor)
+            except (zipfile.BadZipFile, OSError, KeyError, EntryTooLargeError):
+                continue
+            yield epub_path, output_path, chapters
@@ -0,0 +1,202 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from epub_reader import profiling
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+Block = Tuple[str, str]
+
+HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+BLOCK_TAGS = HEADING_TAGS | frozenset((
+    'p', 'div', 'li', 'ul', 'ol', 'dl', 'dt', 'dd', 'blockquote', 'pre', 'section', 'article', 'aside',
+    'header', 'footer', 'nav', 'figure', 'figcaption', 'table', 'tr', 'td', 'th', 'caption', 'hr', 'br', 'body',
+))
+SKIP_TAGS = frozenset(('head', 'script', 'style', 'title', 'svg', 'math', 'noscript'))
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?]) +')
+_ENCODING_RE = re.compile(rb'''<\?xml[^>]*encoding=["']([\w.:-]+)["']''')
+
+
+def _local_name(tag) -> str:
+    if not isinstance(tag, str):
+        return ''
+    return tag.rsplit('}', 1)[-1].rsplit(':', 1)[-1].lower()
+
+
+class BlockBuilder:
+    def __init__(self) -> None:
+        self.blocks: List[Block] = []
+        self._parts: List[str] = []
+        self._kind = 'paragraph'
+        self._skip_depth = 0
+
+    def start(self, tag: str) -> None:
+        name = _local_name(tag)
+        if name in SKIP_TAGS:
+            self._skip_depth += 1
+        elif name in BLOCK_TAGS:
+            self.flush()
+            if name in HEADING_TAGS:
+                self._kind = 'heading'
+
+    def end(self, tag: str) -> None:
+        name = _local_name(tag)
+        if name in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif name in BLOCK_TAGS:
+            self.flush()
+
+    def data(self, text: str) -> None:
+        if not self._skip_depth:
+            self._parts.append(text)
+
+    def flush(self) -> None:
+        text = _WHITESPACE_RE.sub(' ', ''.join(self._parts)).strip()
+        self._parts.clear()
+        if text:
+            self.blocks.append((self._kind, text))
+        self._kind = 'paragraph'
+
+    def drain(self) -> List[Block]:
+        blocks, self.blocks = self.blocks, []
+        return blocks
+
+
+class _StreamingHTMLParser(HTMLParser):
+    def __init__(self, builder: BlockBuilder) -> None:
+        super().__init__(convert_charrefs=True)
+        self.builder = builder
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self.builder.start(tag)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self.builder.start(tag)
+        if _local_name(tag) in SKIP_TAGS:
+            self.builder.end(tag)
+
+    def handle_endtag(self, tag) -> None:
+        self.builder.end(tag)
+
+    def handle_data(self, data) -> None:
+        self.builder.data(data)
+
+
+def _detect_encoding(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    match = _ENCODING_RE.search(head[:512])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def iter_blocks_html(chunks: Iterable[bytes]) -> Iterator[Block]:
+    builder = BlockBuilder()
+    parser = _StreamingHTMLParser(builder)
+    decoder = None
+    for chunk in chunks:
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(_detect_encoding(chunk))(errors='replace')
+        parser.feed(decoder.decode(chunk))
+        yield from builder.drain()
+    if decoder is not None:
+        parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    builder.flush()
+    yield from builder.drain()
+
+
+class _LxmlTarget:
+    def __init__(self, builder: BlockBuilder) -> None:
+        self.builder = builder
+
+    def start(self, tag, attrib) -> None:
+        self.builder.start(tag)
+
+    def end(self, tag) -> None:
+        self.builder.end(tag)
+
+    def data(self, data) -> None:
+        self.builder.data(data)
+
+    def close(self) -> None:
+        self.builder.flush()
+
+
+def iter_blocks_lxml(chunks: Iterable[bytes]) -> Iterator[Block]:
+    builder = BlockBuilder()
+    parser = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if parser is None:
+            parser = etree.HTMLParser(target=_LxmlTarget(builder), recover=True, encoding=_detect_encoding(chunk))
+        parser.feed(chunk)
+        yield from builder.drain()
+    if parser is not None:
+        parser.close()
+    builder.flush()
+    yield from builder.drain()
+
+
+def iter_blocks_bs4(chunks: Iterable[bytes]) -> Iterator[Block]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(b''.join(chunks), 'html.parser')
+    text = _WHITESPACE_RE.sub(' ', soup.get_text(separator=' ')).strip()
+    if text:
+        yield 'paragraph', text
+
+
+EXTRACTORS: Dict[str, Callable[[Iterable[bytes]], Iterator[Block]]] = {
+    'html': iter_blocks_html,
+    'bs4': iter_blocks_bs4,
+}
+if etree is not None:
+    EXTRACTORS['lxml'] = iter_blocks_lxml
+
+default_extractor = 'lxml' if 'lxml' in EXTRACTORS else 'html'
+
+
+def resolve_extractor(name: Optional[str] = None) -> str:
+    if not name or name == 'auto':
+        return default_extractor
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown text extractor '{name}'. Available: {', '.join(sorted(EXTRACTORS))}.")
+    return name
+
+
+def set_default_extractor(name: Optional[str]) -> None:
+    global default_extractor
+    default_extractor = resolve_extractor(name)
+
+
+def format_blocks(blocks: Iterable[Block]) -> Tuple[Optional[str], str]:
+    heading = None
+    lines: List[str] = []
+    for kind, text in blocks:
+        if kind == 'heading':
+            if heading is None:
+                heading = text
+            lines.append(text)
+        else:
+            with profiling.span("sentence_split"):
+                lines.extend(_SENTENCE_RE.split(text))
+    return heading, '\n\n'.join(lines)
+
+
+def extract_text(chunks: Iterable[bytes], extractor: Optional[str] = None) -> Tuple[Optional[str], str]:
+    return format_blocks(EXTRACTORS[resolve_extractor(extractor)](chunks))
@@ -0,0 +1,162 @@
+import bisect
+import re
+import shutil
+import unicodedata
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from epub_reader import profiling
+from epub_reader.book import Page, get_page
+
+LAYOUT_CACHE_SIZE = 2
+
+_COMPLEX_RE = re.compile(r'[^\x20-\x7e]')
+
+
+@lru_cache(maxsize=4096)
+def char_width(character: str) -> int:
+    if character < '\u0300':
+        return 1 if character >= ' ' and not '\x7f' <= character < '\xa0' else 0
+    if unicodedata.combining(character) or unicodedata.category(character) in ('Mn', 'Me', 'Cf'):
+        return 0
+    return 2 if unicodedata.east_asian_width(character) in ('W', 'F') else 1
+
+
+def terminal_width() -> int:
+    return max(1, shutil.get_terminal_size().columns)
+
+
+def text_width(text: str) -> int:
+    if not _COMPLEX_RE.search(text):
+        return len(text)
+    return sum(char_width(character) for character in text)
+
+
+def fit(text: str, width: int) -> str:
+    if not _COMPLEX_RE.search(text):
+        return text[:width]
+    used = 0
+    for position, character in enumerate(text):
+        used += char_width(character)
+        if used > width:
+            return text[:position]
+    return text
+
+
+def pad(text: str, width: int) -> str:
+    text = fit(text, width)
+    return text + ' ' * (width - text_width(text))
+
+
+def _break_ascii(text: str, start: int, end: int, width: int) -> Tuple[int, int]:
+    limit = start + width
+    space = text.rfind(' ', start + 1, limit + 1)
+    if space == -1:
+        return limit, limit
+    return space, space + 1
+
+
+def _break_complex(text: str, start: int, end: int, width: int) -> Tuple[int, int]:
+    used = 0
+    space = -1
+    position = start
+    while position < end:
+        character = text[position]
+        used += char_width(character)
+        if used > width:
+            break
+        if character == ' ' and position > start:
+            space = position
+        position += 1
+    else:
+        return end, end
+    if character == ' ':
+        return position, position + 1
+    if space != -1:
+        return space, space + 1
+    return max(position, start + 1), max(position, start + 1)
+
+
+class PageLayout:
+    __slots__ = ('width', 'text', 'row_starts', 'row_ends')
+
+    def __init__(self, text: str, line_starts: array, width: int) -> None:
+        self.width = max(1, width)
+        self.text = text
+        self.row_starts = array('L')
+        self.row_ends = array('L')
+        with profiling.span("layout", {"width": self.width}):
+            for line, start in enumerate(line_starts):
+                end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(text)
+                self._wrap(start, end)
+
+    def _wrap(self, start: int, end: int) -> None:
+        width = self.width
+        complex_line = _COMPLEX_RE.search(self.text, start, end) is not None
+        while True:
+            if not complex_line and end - start <= width:
+                row_end, next_start = end, end
+            elif complex_line:
+                row_end, next_start = _break_complex(self.text, start, end, width)
+            else:
+                row_end, next_start = _break_ascii(self.text, start, end, width)
+            self.row_starts.append(start)
+            self.row_ends.append(row_end)
+            if next_start >= end:
+                return
+            start = next_start
+
+    def __len__(self) -> int:
+        return len(self.row_starts)
+
+    def row(self, row: int) -> str:
+        return self.text[self.row_starts[row]:self.row_ends[row]]
+
+    def rows(self, start: int, end: int) -> List[str]:
+        return [self.row(row) for row in range(max(0, start), min(end, len(self.row_starts)))]
+
+    def row_at(self, offset: int) -> int:
+        return max(0, bisect.bisect_right(self.row_starts, offset) - 1)
+
+    def screen_count(self, height: int) -> int:
+        return -(-len(self.row_starts) // max(1, height))
+
+
+def page_layout(page: Page, width: int) -> PageLayout:
+    if page.layouts is None:
+        page.layouts = OrderedDict()
+    layout = page.layouts.get(width)
+    if layout is None:
+        layout = page.layouts[width] = PageLayout(page.text, page.line_starts, width)
+        while len(page.layouts) > LAYOUT_CACHE_SIZE:
+            page.layouts.popitem(last=False)
+    else:
+        page.layouts.move_to_end(width)
+    return layout
+
+
+def layout_at(pages: Sequence[str], page_number: int, width: int) -> PageLayout:
+    return page_layout(get_page(pages, page_number), width)
+
+
+def next_screen(pages: Sequence[str], page_number: int, offset: int, width: int, height: int) -> Tuple[int, int]:
+    layout = layout_at(pages, page_number, width)
+    row = layout.row_at(offset) + height
+    if row < len(layout):
+        return page_number, layout.row_starts[row]
+    if page_number < len(pages) - 1:
+        return page_number + 1, 0
+    return page_number, offset
+
+
+def previous_screen(pages: Sequence[str], page_number: int, offset: int, width: int, height: int) -> Tuple[int, int]:
+    layout = layout_at(pages, page_number, width)
+    row = layout.row_at(offset)
+    if row > 0:
+        return page_number, layout.row_starts[max(0, row - height)]
+    if page_number > 0:
+        layout = layout_at(pages, page_number - 1, width)
+        return page_number - 1, layout.row_starts[max(0, len(layout) - height)]
+    return page_number, 0
@@ -0,0 +1,302 @@
+import multiprocessing
+import os
+import re
+import sqlite3
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from queue import Empty, Full
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from epub_reader import profiling
+from epub_reader.archive import DEFAULT_MEMORY_LIMIT, EntryTooLargeError, EpubArchive
+from epub_reader.book import parse_opf_metadata, read_opf, read_spine
+from epub_reader.extract import extract_text
+
+EpubEntry = Tuple[str, str, str, int, str, str]
+
+
+def list_epub_files(directory: str) -> List[str]:
+    return [file for file in os.listdir(directory) if file.endswith('.epub')]
+
+
+def expand_epub_paths(paths: Iterable[str], recursive: bool = True) -> List[Tuple[str, str]]:
+    epub_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            epub_paths.extend((os.path.join(path, epub_file), epub_file) for epub_file in walk_epub_files(path, recursive))
+        else:
+            epub_paths.append((path, os.path.basename(path)))
+    return epub_paths
+
+
+def imap_bounded(executor: Executor, function: Callable, items: Iterable[Tuple], max_pending: int,
+                 ordered: bool = True) -> Iterator:
+    items = iter(items)
+    pending: Deque[Future] = deque()
+    for item in items:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= max_pending:
+            break
+    try:
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                item = next(items, None)
+                if item is not None:
+                    pending.append(executor.submit(function, *item))
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def read_epub_entry(directory: str, epub_file: str) -> EpubEntry:
+    with profiling.span("archive_open", {"file": epub_file}):
+        epub = zipfile.ZipFile(os.path.join(directory, epub_file), 'r')
+    with epub:
+        opf_path, content = read_opf(epub)
+        page_count = len(read_spine(epub, opf_path, content))
+    title, author, date, language = parse_opf_metadata(content)
+    return epub_file, title, author, page_count, date, language
+
+
+def _read_epub_entry_or_none(directory: str, epub_file: str) -> Optional[EpubEntry]:
+    try:
+        return read_epub_entry(directory, epub_file)
+    except (zipfile.BadZipFile, OSError, KeyError):
+        return None
+
+
+def iter_epub_files_with_metadata(directory: str, epub_files: Optional[List[str]] = None,
+                                  workers: Optional[int] = None, use_processes: bool = False) -> Iterator[EpubEntry]:
+    if epub_files is None:
+        epub_files = list_epub_files(directory)
+    if not epub_files:
+        return
+    executor: Executor = ProcessPoolExecutor(max_workers=workers) if use_processes else ThreadPoolExecutor(max_workers=workers)
+    pending = {executor.submit(_read_epub_entry_or_none, directory, epub_file) for epub_file in epub_files}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = future.result()
+                if entry is not None:
+                    yield entry
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+CATALOG_FILE = os.path.join(os.path.expanduser("~"), ".epub_reader", "library.db")
+SORT_COLUMNS = {
+    "title": "title COLLATE NOCASE, path",
+    "author": "author COLLATE NOCASE, title COLLATE NOCASE, path",
+    "language": "language COLLATE NOCASE, title COLLATE NOCASE, path",
+    "recent": "last_read IS NULL, last_read DESC, title COLLATE NOCASE, path",
+}
+
+
+def walk_epub_files(directory: str, recursive: bool = True) -> List[str]:
+    if not recursive:
+        return sorted(list_epub_files(directory))
+    epub_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for file in sorted(files):
+            if file.endswith('.epub'):
+                epub_files.append(os.path.relpath(os.path.join(root, file), directory))
+    return epub_files
+
+
+class LibraryCatalog:
+    def __init__(self, path: str = CATALOG_FILE) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS books ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "title TEXT, author TEXT, date TEXT, language TEXT, page_count INTEGER, "
+            "page_number INTEGER NOT NULL DEFAULT 0, line_offset INTEGER NOT NULL DEFAULT 0, "
+            "progress REAL NOT NULL DEFAULT 0, last_read REAL)"
+        )
+        self._connection.commit()
+
+    def __enter__(self) -> 'LibraryCatalog':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _rows_under(self, directory: str) -> Dict[str, Tuple[int, int]]:
+        prefix = os.path.join(directory, '')
+        rows = self._connection.execute(
+            "SELECT path, size, mtime_ns FROM books WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+        )
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def scan(self, directory: str, recursive: bool = True, workers: Optional[int] = None,
+             use_processes: bool = False) -> Iterator[EpubEntry]:
+        directory = os.path.abspath(directory)
+        known = self._rows_under(directory)
+        stats: Dict[str, Tuple[int, int]] = {}
+        changed = []
+        for epub_file in walk_epub_files(directory, recursive):
+            try:
+                stat = os.stat(os.path.join(directory, epub_file))
+            except OSError:
+                continue
+            stats[epub_file] = (stat.st_size, stat.st_mtime_ns)
+            if known.get(os.path.join(directory, epub_file)) != stats[epub_file]:
+                changed.append(epub_file)
+
+        present = {os.path.join(directory, epub_file) for epub_file in stats}
+        stale = [path for path in known if path not in present and (recursive or os.path.dirname(path) == directory)]
+        self._connection.executemany("DELETE FROM books WHERE path = ?", [(path,) for path in stale])
+        self._connection.commit()
+
+        unchanged = set(stats).difference(changed)
+        for entry in self.entries(directory):
+            if entry[0] in unchanged:
+                yield entry
+
+        try:
+            for entry in iter_epub_files_with_metadata(directory, changed, workers=workers, use_processes=use_processes):
+                epub_file, title, author, page_count, date, language = entry
+                size, mtime_ns = stats[epub_file]
+                self._connection.execute(
+                    "INSERT INTO books (path, size, mtime_ns, title, author, date, language, page_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                    "title = excluded.title, author = excluded.author, date = excluded.date, "
+                    "language = excluded.language, page_count = excluded.page_count",
+                    (os.path.join(directory, epub_file), size, mtime_ns, title, author, date, language, page_count),
+                )
+                yield entry
+        finally:
+            self._connection.commit()
+
+    def entries(self, directory: str, sort: str = "title", author: Optional[str] = None,
+                language: Optional[str] = None, recent: bool = False) -> List[EpubEntry]:
+        directory = os.path.abspath(directory)
+        prefix = os.path.join(directory, '')
+        query = ("SELECT path, title, author, page_count, date, language FROM books "
+                 "WHERE substr(path, 1, ?) = ?")
+        parameters: List = [len(prefix), prefix]
+        if author:
+            query += " AND author LIKE ?"
+            parameters.append(f"%{author}%")
+        if language:
+            query += " AND language LIKE ?"
+            parameters.append(f"{language}%")
+        if recent:
+            query += " AND last_read IS NOT NULL"
+        query += f" ORDER BY {SORT_COLUMNS.get(sort, SORT_COLUMNS['title'])}"
+        return [(os.path.relpath(path, directory), title, author_name, page_count, date, language_name)
+                for path, title, author_name, page_count, date, language_name in self._connection.execute(query, parameters)]
+
+    def record_position(self, epub_path: str, page_number: int, line_offset: int, progress: float) -> None:
+        self._connection.execute(
+            "UPDATE books SET page_number = ?, line_offset = ?, progress = ?, last_read = ? WHERE path = ?",
+            (page_number, line_offset, progress, time.time(), os.path.abspath(epub_path)),
+        )
+        self._connection.commit()
+
+
+class GrepMatch(NamedTuple):
+    file: str
+    chapter: int
+    sentence: str
+
+
+_grep_queue = None
+_grep_stop = None
+
+
+def _init_grep_worker(queue, stop_event) -> None:
+    global _grep_queue, _grep_stop
+    _grep_queue, _grep_stop = queue, stop_event
+
+
+def _put_unless_stopped(item) -> bool:
+    while not _grep_stop.is_set():
+        try:
+            _grep_queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _grep_epub(directory: str, epub_file: str, query: str, memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    try:
+        with EpubArchive(os.path.join(directory, epub_file), memory_limit=memory_limit) as archive:
+            for chapter, name in enumerate(read_spine(archive.zip)):
+                if _grep_stop.is_set():
+                    return
+                try:
+                    text = extract_text(archive.iter_chunks(name))[1]
+                except EntryTooLargeError:
+                    continue
+                if not pattern.search(text):
+                    continue
+                for sentence in text.split('\n'):
+                    if pattern.search(sentence) and not _put_unless_stopped(GrepMatch(epub_file, chapter, sentence)):
+                        return
+    except (zipfile.BadZipFile, OSError, KeyError):
+        pass
+    finally:
+        _put_unless_stopped(None)
+
+
+def grep_library(directory: str, query: str, epub_files: Optional[List[str]] = None, max_hits: Optional[int] = None,
+                 workers: Optional[int] = None, recursive: bool = True,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT) -> Iterator[GrepMatch]:
+    if epub_files is None:
+        epub_files = walk_epub_files(directory, recursive)
+    if not epub_files or not query:
+        return
+    queue = multiprocessing.Queue(maxsize=1024)
+    stop_event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_grep_worker, initargs=(queue, stop_event))
+    futures = [executor.submit(_grep_epub, directory, epub_file, query, memory_limit) for epub_file in epub_files]
+    remaining = len(futures)
+    hits = 0
+    try:
+        while remaining:
+            try:
+                item = queue.get(timeout=0.1)
+            except Empty:
+                if all(future.done() for future in futures) and queue.empty():
+                    break
+                continue
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+            hits += 1
+            if max_hits is not None and hits >= max_hits:
+                break
+    finally:
+        stop_event.set()
+        for future in futures:
+            future.cancel()
+        while not all(future.done() for future in futures):
+            try:
+                queue.get(timeout=0.05)
+            except Empty:
+                pass
+        executor.shutdown(wait=True)
@@ -1,9 +1,26 @@
+import argparse
 import os
 import zipfile
 import re
 import json
-from typing import List, Tuple, Dict
-from bs4 import BeautifulSoup
+import signal
+import sys
+from functools import partial
+from typing import Iterable, List, Optional, Tuple, Dict
+from epub_reader import profiling
+from epub_reader.api import Library
+from epub_reader.book import LazyBook, get_page, legacy_page_map, parse_opf_metadata, read_opf
+from epub_reader.extract import EXTRACTORS, set_default_extractor
+from epub_reader.export import EXPORT_FORMATS, JSONL_UNITS, export_book, export_directory
+from epub_reader.cache import CACHE_VERSION
+from epub_reader.session import (SessionState as SessionStateType, SessionStore, clamp_state, read_session_file,
+                                 write_json_atomic)
+from epub_reader.search import BookIndex, SearchHit
+from epub_reader.layout import next_screen, page_layout, previous_screen, terminal_width
+from epub_reader.store import TextStore
+from epub_reader.tui import FullScreenReader
+from epub_reader.warmup import WarmUp
+from epub_reader.library import SORT_COLUMNS, EpubEntry, LibraryCatalog, grep_library, iter_epub_files_with_metadata
 
 GLOBAL_SETTINGS_FILE = os.path.join(os.path.expanduser("~"), ".epub_reader", "global_settings.json")
 
@@ -14,14 +31,22 @@ def load_global_settings() -> Dict:
     return {"lines_per_screen": 40}
 
 def save_global_settings(settings: Dict) -> None:
-    os.makedirs(os.path.dirname(GLOBAL_SETTINGS_FILE), exist_ok=True)
-    with open(GLOBAL_SETTINGS_FILE, 'w', encoding='utf-8') as file:
-        json.dump(settings, file)
+    write_json_atomic(GLOBAL_SETTINGS_FILE, settings)
+
+book_title = ""
+book_author = ""
+background: Optional[WarmUp] = None
+
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"
 
 global_settings = load_global_settings()
 LINES_PER_SCREEN = global_settings.get("lines_per_screen", 40)
+try:
+    set_default_extractor(global_settings.get("extractor", "auto"))
+except ValueError:
+    set_default_extractor("auto")
 
-def print_colored(text: str, color: str) -> None:
+def colored(text: str, color: str) -> str:
     colors: Dict[str, str] = {
         "green": "\033[92m",
         "red": "\033[91m",
@@ -31,8 +56,10 @@ def print_colored(text: str, color: str) -> None:
         "magenta": "\033[95m"
     }
     color_code: str = colors.get(color.lower(), "\033[0m")
-    colored_text: str = f"{color_code}{text}\033[0m"
-    print(colored_text)
+    return f"{color_code}{text}\033[0m"
+
+def print_colored(text: str, color: str) -> None:
+    print(colored(text, color))
 
 def input_colored(prompt: str, color: str) -> str:
     colors: Dict[str, str] = {
@@ -48,78 +75,109 @@ def input_colored(prompt: str, color: str) -> str:
     return input(colored_prompt)
 
 def read_epub_metadata(epub_path: str) -> Tuple[str, str, str, str]:
-    with zipfile.ZipFile(epub_path, 'r') as epub:
-        for file in epub.namelist():
-            if 'content.opf' in file:
-                with epub.open(file) as content_file:
-                    content = content_file.read().decode('utf-8')
-                    title_search = re.search(r'<dc:title[^>]*>(.*?)</dc:title>', content)
-                    author_search = re.search(r'<dc:creator[^>]*>(.*?)</dc:creator>', content)
-                    date_search = re.search(r'<dc:date[^>]*>(.*?)</dc:date>', content)
-                    language_search = re.search(r'<dc:language[^>]*>(.*?)</dc:language>', content)
-                    title = title_search.group(1) if title_search else 'Unknown Title'
-                    author = author_search.group(1) if author_search else 'Unknown Author'
-                    publication_date = date_search.group(1) if date_search else 'Unknown Date'
-                    language = language_search.group(1) if language_search else 'Unknown Language'
-                    return title, author, publication_date, language
-    return 'Unknown Title', 'Unknown Author', 'Unknown Date', 'Unknown Language'
-
-def read_epub_pages(epub_path: str) -> List[str]:
-    pages = []
-    with zipfile.ZipFile(epub_path, 'r') as epub:
-        for file in sorted(epub.namelist()):
-            if file.endswith(('.html', '.xhtml')):
-                with epub.open(file) as html_file:
-                    soup = BeautifulSoup(html_file.read(), 'html.parser')
-                    text = soup.get_text(separator=' ')
-                    text = re.sub(r'\s+', ' ', text).strip()
-                    sentences = re.split(r'(?<=[.!?]) +', text)
-                    cleaned_text = '\n\n'.join(sentences)
-                    pages.append(cleaned_text)
-    return pages
-
-def get_epub_files_with_metadata(directory: str) -> List[Tuple[str, str, str, int, str, str]]:
-    epub_files = [file for file in os.listdir(directory) if file.endswith('.epub')]
-    epub_files_with_metadata = []
-
-    for epub_file in epub_files:
-        epub_path = os.path.join(directory, epub_file)
-        title, author, date, language = read_epub_metadata(epub_path)
-        with zipfile.ZipFile(epub_path, 'r') as epub:
-            page_count = sum(1 for file in epub.namelist() if file.endswith(('.html', '.xhtml')))
-        epub_files_with_metadata.append((epub_file, title, author, page_count, date, language))
-
-    return epub_files_with_metadata
-
-def display_choices(epub_files_with_metadata: List[Tuple[str, str, str, int, str, str]]) -> str:
-    print_colored("Available EPUB files:", "blue")
-    for index, (file, title, author, count, date, language) in enumerate(epub_files_with_metadata, start=1):
-        print_colored(f"{index}. {title} by {author} ({count} pages, {date}, {language})", "green")
+    with profiling.span("archive_open"):
+        epub = zipfile.ZipFile(epub_path, 'r')
+    with epub:
+        _, content = read_opf(epub)
+    return parse_opf_metadata(content)
+
+def read_epub_pages(epub_path: str) -> TextStore:
+    budget = global_settings.get("text_memory_budget_mb")
+    with LazyBook(epub_path, cache_size=1, prefetch=False) as book:
+        return TextStore(book, memory_budget=budget * 1024 * 1024 if budget is not None else None)
+
+def get_memory_limit() -> int:
+    return global_settings.get("memory_limit_mb", 256) * 1024 * 1024
+
+def open_epub_book(epub_path: str) -> LazyBook:
+    return LazyBook(
+        epub_path,
+        cache_size=global_settings.get("chapter_cache_size", 32),
+        disk_cache=global_settings.get("disk_cache", True),
+        disk_cache_limit=global_settings.get("disk_cache_limit_mb", 256) * 1024 * 1024,
+        use_mmap=global_settings.get("archive_mmap", False),
+        memory_limit=get_memory_limit(),
+    )
+
+def get_epub_files_with_metadata(directory: str) -> List[EpubEntry]:
+    entries = iter_epub_files_with_metadata(directory, workers=global_settings.get("scan_workers"),
+                                            use_processes=global_settings.get("scan_processes", False))
+    return sorted(entries, key=lambda entry: entry[0])
+
+def search_library(directory: str, epub_files: Optional[List[str]] = None) -> None:
+    query = input_colored("Enter text to search for in all books: ", "yellow").strip()
+    if not query:
+        return
+    max_hits = global_settings.get("library_search_max_hits", 100)
+    hits = 0
+    for match in grep_library(directory, query, epub_files, max_hits=max_hits, workers=global_settings.get("library_search_workers"),
+                              memory_limit=get_memory_limit()):
+        print_colored(f"{match.file} (page {match.chapter + 1}):\n{match.sentence}\n", "green")
+        hits += 1
+    if not hits:
+        print_colored("No matches found.", "red")
+    elif hits >= max_hits:
+        print_colored(f"Stopped after {max_hits} matches.", "yellow")
+
+def display_choices(epub_files_with_metadata: Iterable[EpubEntry], directory: Optional[str] = None) -> str:
+    choices = []
+    for entry in epub_files_with_metadata:
+        if not choices:
+            print_colored("Available EPUB files:", "blue")
+        choices.append(entry)
+        file, title, author, count, date, language = entry
+        print_colored(f"{len(choices)}. {title} by {author} ({count} pages, {date}, {language})", "green")
         print()
+    if not choices:
+        return ''
+    prompt = "Enter the number of the EPUB file you want to read: "
+    if directory is not None:
+        prompt = "Enter the number of the EPUB file you want to read ('g' to search all books): "
     while True:
-        choice = input_colored("Enter the number of the EPUB file you want to read: ", "yellow").strip()
+        choice = input_colored(prompt, "yellow").strip()
+        if directory is not None and choice.lower() == 'g':
+            search_library(directory, [entry[0] for entry in choices])
+            continue
         try:
             choice = int(choice)
-            if 1 <= choice <= len(epub_files_with_metadata):
+            if 1 <= choice <= len(choices):
                 break
             else:
                 print_colored("Invalid choice. Please enter a number corresponding to the list.", "red")
         except ValueError:
             print_colored("Invalid input. Please enter a number.", "red")
-    return epub_files_with_metadata[choice - 1][0]
+    return choices[choice - 1][0]
+
+def display_page(pages: List[str], page_number: int, line_offset: int = 0, lines_per_screen: int = 20,
+                 title: Optional[str] = None, author: Optional[str] = None, offset: Optional[int] = None) -> None:
+    with profiling.span("render"):
+        render_page(pages, page_number, line_offset, lines_per_screen,
+                    book_title if title is None else title, book_author if author is None else author, offset)
 
-def display_page(pages: List[str], page_number: int, line_offset: int = 0, lines_per_screen: int = 20) -> None:
+def render_page(pages: List[str], page_number: int, line_offset: int, lines_per_screen: int, title: str, author: str,
+                offset: Optional[int] = None) -> None:
     if 0 <= page_number < len(pages):
-        os.system('clear' if os.name == 'posix' else 'cls')
-        page_lines = pages[page_number].split('\n')
-        total_lines = len(page_lines)
-        start_line = line_offset
-        end_line = min(start_line + lines_per_screen, total_lines)
-        for line in page_lines[start_line:end_line]:
-            print(line)
+        if os.name != 'posix':
+            os.system('cls')
+        page = get_page(pages, page_number)
+        if offset is None:
+            offset = page.offset_of(line_offset)
+        total_lines = len(page)
+        start_line = page.line_at(offset)
+        layout = page_layout(page, terminal_width())
+        row = layout.row_at(offset)
+        frame = layout.rows(row, row + lines_per_screen)
         progress = (start_line / total_lines) * 100 if total_lines else 100
-        print_colored(f"\n{'-'*20} Page {page_number + 1} - {progress:.2f}% {'-'*20}\n", "cyan")
-        print_colored(f"{book_title} by {book_author}", "magenta")  # Display current book
+        book_progress = ""
+        global_line = pages.global_line(page_number, start_line) if isinstance(pages, LazyBook) else None
+        if global_line is not None:
+            book_progress = f" (book {(global_line / max(1, pages.line_table()[-1])) * 100:.2f}%)"
+        if background is not None and background.status():
+            book_progress += f" [{background.status()}]"
+        frame.append(colored(f"\n{'-'*20} Page {page_number + 1} - {progress:.2f}%{book_progress} {'-'*20}\n", "cyan"))
+        frame.append(colored(f"{title} by {author}", "magenta"))  # Display current book
+        sys.stdout.write((CLEAR_SCREEN if os.name == 'posix' else "") + "\n".join(frame) + "\n")
+        sys.stdout.flush()
 
 def save_page(pages: List[str], page_number: int, title: str, author: str) -> None:
     if 0 <= page_number < len(pages):
@@ -136,13 +194,46 @@ def save_book(pages: List[str], title: str, author: str) -> None:
     print_colored(f"Book saved as '{filename}'", "green")
 
 def search_text(pages: List[str], query: str) -> List[Tuple[int, str]]:
+    with profiling.span("search", {"query": query}):
+        return find_sentences(pages, query)
+
+def find_sentences(pages: List[str], query: str) -> List[Tuple[int, str]]:
     results = []
+    if not query or '.' in query:
+        for i, page in enumerate(pages):
+            matches = re.finditer(rf'[^.]*{re.escape(query)}[^.]*\.', page, re.IGNORECASE)
+            for match in matches:
+                results.append((i, match.group()))
+        return results
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
     for i, page in enumerate(pages):
-        matches = re.finditer(rf'[^.]*{re.escape(query)}[^.]*\.', page, re.IGNORECASE)
-        for match in matches:
-            results.append((i, match.group()))
+        position = 0
+        for match in pattern.finditer(page):
+            if match.start() < position:
+                continue
+            start = max(position, page.rfind('.', 0, match.start()) + 1)
+            end = page.find('.', match.end())
+            if end == -1:
+                break
+            results.append((i, page[start:end + 1]))
+            position = end + 1
     return results
 
+def display_search_results(hits: List[SearchHit]) -> None:
+    if not hits:
+        print_colored("No matches found.", "red")
+        return
+    for hit in hits:
+        sentence = hit.sentence
+        for start, end in reversed(hit.highlights):
+            sentence = f"{sentence[:start]}\033[93m{sentence[start:end]}\033[92m{sentence[end:]}"
+        print_colored(f"Page {hit.page + 1}:\n{sentence}\n", "green")
+    print_colored(f"{len(hits)} matching sentences.", "blue")
+
+def get_search_index(book_id: str, pages: LazyBook) -> BookIndex:
+    index_file = os.path.join(os.path.expanduser("~"), ".epub_reader", f"{book_id}.idx")
+    return BookIndex(index_file, f"{pages.fingerprint}:{pages.extractor}:{CACHE_VERSION}", len(pages))
+
 def add_bookmark(bookmarks: List[Tuple[int, float]], page_number: int, progress: float) -> None:
     if (page_number, progress) not in bookmarks:
         bookmarks.append((page_number, progress))
@@ -192,13 +283,24 @@ def jump_to_percentage(pages: List[str]) -> Tuple[int, int]:
             if percentage < 0 or percentage > 100:
                 print_colored("Invalid percentage. Please enter a value between 0 and 100.", "red")
                 continue
-            page_lines = pages[page_number].split('\n')
-            total_lines = len(page_lines)
+            total_lines = len(get_page(pages, page_number))
             line_offset = int((percentage / 100) * total_lines)
             return page_number, line_offset
         except ValueError:
             print_colored("Invalid input. Please enter a number.", "red")
 
+def jump_to_book_percentage(pages: LazyBook) -> Tuple[int, int]:
+    while True:
+        try:
+            percentage = float(input_colored("Enter the percentage of the book to jump to: ", "yellow").strip())
+            if percentage < 0 or percentage > 100:
+                print_colored("Invalid percentage. Please enter a value between 0 and 100.", "red")
+                continue
+            total_lines = pages.line_table()[-1]
+            return pages.locate(int((percentage / 100) * total_lines))
+        except ValueError:
+            print_colored("Invalid input. Please enter a number.", "red")
+
 def save_reading_session(book_id: str, page_number: int, line_offset: int, progress: float, bookmarks: List[Tuple[int, float]], search_history: List[str]) -> None:
     session_data = {
         "page_number": page_number,
@@ -208,24 +310,14 @@ def save_reading_session(book_id: str, page_number: int, line_offset: int, progr
         "search_history": search_history
     }
     session_file = os.path.join(os.path.expanduser("~"), ".epub_reader", f"{book_id}.json")
-    with open(session_file, 'w', encoding='utf-8') as file:
-        json.dump(session_data, file)
+    with profiling.span("session_write"):
+        write_json_atomic(session_file, session_data)
 
 def load_reading_session(book_id: str) -> Tuple[int, int, float, List[Tuple[int, float]], List[str]]:
     session_file = os.path.join(os.path.expanduser("~"), ".epub_reader", f"{book_id}.json")
-    if os.path.exists(session_file):
-        with open(session_file, 'r', encoding='utf-8') as file:
-            session_data = json.load(file)
-            return (
-                session_data.get("page_number", 0),
-                session_data.get("line_offset", 0),
-                session_data.get("progress", 0.0),
-                session_data.get("bookmarks", []),
-                session_data.get("search_history", [])
-            )
-    return 0, 0, 0.0, [], []
-
-def get_book_id(epub_path: str) -> str:
+    return read_session_file(session_file)
+
+def get_legacy_book_id(epub_path: str) -> str:
     return os.path.splitext(os.path.basename(epub_path))[0]
 
 def adjust_lines_per_screen() -> None:
@@ -245,31 +337,202 @@ def adjust_lines_per_screen() -> None:
         except ValueError:
             print_colored("Invalid input. Please enter a number.", "red")
 
-def main() -> None:
-    global book_title, book_author
-
-    current_directory = os.getcwd()
-    epub_files_with_metadata = get_epub_files_with_metadata(current_directory)
-
-    if not epub_files_with_metadata:
-        print_colored("No EPUB files found in the directory.", "red")
+def run_grep(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="epub-reader grep", description="Search every EPUB file in a directory.")
+    parser.add_argument("query", help="text to search for (case-insensitive)")
+    parser.add_argument("directory", nargs="?", default=os.getcwd(), help="directory to search (default: current directory)")
+    parser.add_argument("-m", "--max-hits", type=int, help="stop after this many matches")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false", help="only search the top-level directory")
+    args = parser.parse_args(argv)
+    for match in grep_library(args.directory, args.query, max_hits=args.max_hits, workers=args.workers,
+                              recursive=args.recursive, memory_limit=get_memory_limit()):
+        print(f"{match.file}:{match.chapter + 1}: {match.sentence}", flush=True)
+
+def run_export(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="epub-reader export", description="Export EPUB files to text, Markdown or JSONL.")
+    parser.add_argument("paths", nargs="+", help="EPUB files or directories of EPUB files")
+    parser.add_argument("-f", "--format", choices=sorted(EXPORT_FORMATS), default="txt", help="output format (default: txt)")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="output directory (default: current directory)")
+    parser.add_argument("--unit", choices=JSONL_UNITS, default="chapter", help="one JSONL record per chapter or per sentence")
+    parser.add_argument("--extractor", choices=["auto"] + sorted(EXTRACTORS),
+                        help="HTML text extractor (default: the extractor setting)")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false", help="only export the top level of directories")
+    args = parser.parse_args(argv)
+    for epub_path, output_path, chapters in export_directory(args.paths, args.output, args.format, args.unit,
+                                                             workers=args.workers, recursive=args.recursive,
+                                                             memory_limit=get_memory_limit(), extractor=args.extractor):
+        print(f"{epub_path} -> {output_path} ({chapters} pages)", flush=True)
+
+def run_headless(command: str, argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog=f"epub-reader {command}", description=HEADLESS_COMMANDS[command])
+    if command == "search":
+        parser.add_argument("query", help="text to search for (case-insensitive)")
+    parser.add_argument("paths", nargs="*", default=[os.getcwd()], help="EPUB files or directories (default: current directory)")
+    parser.add_argument("-w", "--workers", type=int, help="number of workers (default: CPU count)")
+    parser.add_argument("--threads", action="store_true", help="use threads instead of worker processes")
+    parser.add_argument("--ordered", action="store_true", help="emit results in input order instead of as they finish")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false", help="only read the top level of directories")
+    parser.add_argument("--json", action="store_true", help="emit a single JSON array instead of NDJSON")
+    if command == "search":
+        parser.add_argument("-m", "--max-hits", type=int, help="stop after this many matches per book")
+    args = parser.parse_args(argv)
+
+    library = Library(args.paths, recursive=args.recursive, workers=args.workers,
+                      use_processes=not args.threads, ordered=args.ordered, memory_limit=get_memory_limit())
+    if command == "scan":
+        records = library.scan()
+    elif command == "meta":
+        records = library.metadata()
+    elif command == "text":
+        records = library.texts()
+    elif command == "search":
+        records = library.search(args.query, args.max_hits)
+    else:
+        records = library.stats()
+    if args.json:
+        json.dump(list(records), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+        return
+    for record in records:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+HEADLESS_COMMANDS = {
+    "scan": "List title, author, date, language and page count of EPUB files as JSON.",
+    "meta": "Print the full metadata and spine of EPUB files as JSON.",
+    "text": "Extract the text of EPUB files as JSON, one record per book.",
+    "search": "Search EPUB files and print matching sentences as JSON.",
+    "stats": "Count pages, sentences, words and characters of EPUB files as JSON.",
+}
+
+COMMANDS = {
+    "grep": run_grep,
+    "export": run_export,
+}
+COMMANDS.update({command: partial(run_headless, command) for command in HEADLESS_COMMANDS})
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="epub-reader", description="Read EPUB files in the terminal.",
+                                     epilog="Commands: " + ", ".join(f"'epub-reader {name} --help'" for name in COMMANDS))
+    parser.add_argument("directory", nargs="?", default=os.getcwd(), help="directory to scan for EPUB files (default: current directory)")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false", help="only scan the top-level directory")
+    parser.add_argument("--sort", choices=sorted(SORT_COLUMNS), help="sort the library by title, author, language or recently read")
+    parser.add_argument("--author", help="only list books whose author contains this text")
+    parser.add_argument("--language", help="only list books in this language")
+    parser.add_argument("--recent", action="store_true", help="only list books that have been opened before")
+    parser.add_argument("--fullscreen", action="store_true", default=global_settings.get("fullscreen", False),
+                        help="read in a full-screen view with single-key navigation")
+    parser.add_argument("--profile", action="store_true", help=f"print a timing summary on exit (also: {profiling.PROFILE_ENVIRONMENT_VARIABLE}=1)")
+    parser.add_argument("--profile-output", metavar="PATH", help="also write a Chrome trace JSON file on exit")
+    return parser.parse_args(argv)
+
+def enable_profiling(argv: List[str]) -> List[str]:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-output")
+    args, remaining = parser.parse_known_args(argv)
+    if args.profile or args.profile_output:
+        profiling.enable(args.profile_output)
+    else:
+        profiling.enable_from_environment()
+    return remaining
+
+def main(argv: Optional[List[str]] = None) -> None:
+    if argv is None:
+        argv = sys.argv[1:]
+    argv = enable_profiling(argv)
+    if argv and argv[0] in COMMANDS:
+        try:
+            COMMANDS[argv[0]](argv[1:])
+            sys.stdout.flush()
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
         return
+    args = parse_args(argv)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, exit_on_signal)
+    try:
+        read_library(args)
+    except KeyboardInterrupt:
+        print_colored("\nProgram exited gracefully.", "magenta")
 
-    chosen_file = display_choices(epub_files_with_metadata)
-    epub_path = os.path.join(current_directory, chosen_file)
-    title, author, date, language = read_epub_metadata(epub_path)
-    pages = read_epub_pages(epub_path)
+def exit_on_signal(signum: int, frame) -> None:
+    sys.exit(128 + signum)
+
+def read_library(args: argparse.Namespace) -> None:
+    current_directory = os.path.abspath(args.directory)
+    with LibraryCatalog() as catalog:
+        epub_files_with_metadata = catalog.scan(current_directory, recursive=args.recursive,
+                                                workers=global_settings.get("scan_workers"),
+                                                use_processes=global_settings.get("scan_processes", False))
+        if args.sort or args.author or args.language or args.recent:
+            for _ in epub_files_with_metadata:
+                pass
+            epub_files_with_metadata = catalog.entries(current_directory, sort=args.sort or "title", author=args.author,
+                                                       language=args.language, recent=args.recent)
+        chosen_file = display_choices(epub_files_with_metadata, current_directory)
+
+        if not chosen_file:
+            print_colored("No EPUB files found in the directory.", "red")
+            return
+
+        epub_path = os.path.join(current_directory, chosen_file)
+        pages = open_epub_book(epub_path)
+        title, author, date, language = pages.metadata
+        try:
+            read_book(pages, epub_path, title, author, catalog, fullscreen=args.fullscreen)
+        finally:
+            pages.close()
+
+def read_book(pages: LazyBook, epub_path: str, title: str, author: str, catalog: Optional[LibraryCatalog] = None,
+              fullscreen: bool = False) -> None:
+    global book_title, book_author, background
 
     book_title, book_author = title, author
 
-    book_id = get_book_id(epub_path)
+    book_id = pages.fingerprint
 
     if not os.path.exists(os.path.expanduser("~/.epub_reader")):
         os.makedirs(os.path.expanduser("~/.epub_reader"))
 
-    page_number, line_offset, progress, bookmarks, search_history = load_reading_session(book_id)
+    def record_position(state: SessionStateType) -> None:
+        if catalog is not None:
+            catalog.record_position(epub_path, state[0], state[1], state[2])
 
-    display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
+    session = SessionStore(book_id, legacy_id=get_legacy_book_id(epub_path),
+                           debounce=global_settings.get("session_save_interval", 2.0), on_flush=record_position,
+                           legacy_page_map=legacy_page_map(pages.archive.zip.namelist(), pages.chapters))
+    search_index = get_search_index(book_id, pages)
+    if global_settings.get("background_warmup", True):
+        background = WarmUp(pages, search_index, start_page=session.state[0])
+    try:
+        if fullscreen and sys.stdin.isatty() and sys.stdout.isatty():
+            FullScreenReader(pages, session, search_index, title, author, warm_up=background).run()
+        else:
+            read_book_session(pages, session, book_id, title, author, search_index, background)
+    finally:
+        if background is not None:
+            background.stop()
+            background = None
+        search_index.save()
+        session.close()
+
+def read_book_session(pages: LazyBook, session: SessionStore, book_id: str, title: str, author: str,
+                      search_index: Optional[BookIndex] = None, warm_up: Optional[WarmUp] = None) -> None:
+    epub_path = pages.epub_path
+    page_number, line_offset, progress, bookmarks, search_history = clamp_state(session.state, len(pages))
+    bookmarks = list(bookmarks)
+    search_history = list(search_history)
+    if search_index is None:
+        search_index = get_search_index(book_id, pages)
+    offset = get_page(pages, page_number).offset_of(line_offset)
+
+    display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN, offset=offset)
+    if warm_up is not None:
+        warm_up.start()
 
     show_help = False
 
@@ -278,25 +541,15 @@ def main() -> None:
             command = input_colored("\n'n' for next page\n'p' for previous page\n'h' for help (this will hide all other commands)\n\nEnter your choice: ", "cyan").strip().lower()
         else:
             command = input_colored("\n'n' for next line\n'p' for previous line\n'h' for help (show all commands)\n\nEnter your choice: ", "cyan").strip().lower()
-        
+        if warm_up is not None:
+            warm_up.pause()
+
         if command == 'n':
-            page_lines = pages[page_number].split('\n')
-            if line_offset + LINES_PER_SCREEN < len(page_lines):
-                line_offset += LINES_PER_SCREEN
-            else:
-                if page_number < len(pages) - 1:
-                    page_number += 1
-                    line_offset = 0
-            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
+            page_number, offset = next_screen(pages, page_number, offset, terminal_width(), LINES_PER_SCREEN)
+            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN, offset=offset)
         elif command == 'p':
-            if line_offset > 0:
-                line_offset -= LINES_PER_SCREEN
-            else:
-                if page_number > 0:
-                    page_number -= 1
-                    page_lines = pages[page_number].split('\n')
-                    line_offset = max(0, len(page_lines) - LINES_PER_SCREEN)
-            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
+            page_number, offset = previous_screen(pages, page_number, offset, terminal_width(), LINES_PER_SCREEN)
+            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN, offset=offset)
         elif command == 'h':
             if show_help:
                 show_help = False
@@ -306,27 +559,34 @@ def main() -> None:
                     "'p' for previous line\n"
                     "'j' to jump to page\n"
                     "'jp' to jump to percentage\n"
+                    "'jg' to jump to percentage of the whole book\n"
                     "'b' to add bookmark\n"
                     "'bm' to view bookmarks\n"
                     "'jb' to jump to bookmark\n"
                     "'db' to delete bookmark\n"
                     "'dab' to delete all bookmarks\n"
-                    "'s' to search\n"
+                    "'s' to search (use \"quotes\" for phrases and a trailing * for prefixes)\n"
+                    "'rs' to re-run a search from the history\n"
                     "'sh' to view search history\n"
                     "'ds' to delete search history\n"
                     "'das' to delete all search history\n"
                     "'sp' to save page as text file\n"
-                    "'sb' to save book as text file\n"
+                    "'sb' to save book as a text, Markdown or JSONL file\n"
                     "'al' to adjust lines per screen\n"
                     "'q' to quit\n", "cyan")
                 show_help = True
         # Other command handlers remain unchanged...
         elif command == 'j':
             page_number = jump_to_page(pages)
-            line_offset = 0
+            line_offset = offset = 0
             display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
         elif command == 'jp':
             page_number, line_offset = jump_to_percentage(pages)
+            offset = get_page(pages, page_number).offset_of(line_offset)
+            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
+        elif command == 'jg':
+            page_number, line_offset = jump_to_book_percentage(pages)
+            offset = get_page(pages, page_number).offset_of(line_offset)
             display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
         elif command == 'jb':
             if bookmarks:
@@ -335,7 +595,8 @@ def main() -> None:
                     bookmark_choice = int(input_colored("Enter the number of the bookmark to jump to: ", "yellow").strip()) - 1
                     if 0 <= bookmark_choice < len(bookmarks):
                         page_number, progress = bookmarks[bookmark_choice]
-                        line_offset = int((progress / 100) * len(pages[page_number].split('\n')))
+                        line_offset = int((progress / 100) * pages.line_count(page_number))
+                        offset = get_page(pages, page_number).offset_of(line_offset)
                         display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
                     else:
                         print_colored("Invalid bookmark choice.", "red")
@@ -388,39 +649,55 @@ def main() -> None:
             print_colored("All search history deleted.", "green")
         elif command == 'al':
             adjust_lines_per_screen()
-            page_lines = pages[page_number].split('\n')
-            total_lines = len(page_lines)
-            line_offset = int((progress / 100) * total_lines)
-            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN)
+            display_page(pages, page_number, line_offset, lines_per_screen=LINES_PER_SCREEN, offset=offset)
         elif command == 'sp':
             save_page(pages, page_number, title, author)
         elif command == 'sb':
-            save_book(pages, title, author)
+            fmt = input_colored(f"Enter the format ({', '.join(EXPORT_FORMATS)}) [txt]: ", "yellow").strip().lower() or "txt"
+            if fmt in EXPORT_FORMATS:
+                filename = f"{title}_{author}{EXPORT_FORMATS[fmt]}"
+                try:
+                    export_book(epub_path, filename, fmt, workers=global_settings.get("export_workers"), pages=pages)
+                    print_colored(f"Book saved as '{filename}'", "green")
+                except (zipfile.BadZipFile, OSError, KeyError) as error:
+                    print_colored(f"Could not save the book: {error}", "red")
+            else:
+                print_colored("Invalid format.", "red")
         elif command == 'b':
-            page_lines = pages[page_number].split('\n')
-            progress = (line_offset / len(page_lines)) * 100 if len(page_lines) else 100
+            progress = (line_offset / pages.line_count(page_number)) * 100
             add_bookmark(bookmarks, page_number, progress)
         elif command == 'bm':
             display_bookmarks(bookmarks)
         elif command == 's':
             query = input_colored("Enter text to search: ", "yellow")
-            results = search_text(pages, query)
+            display_search_results(search_index.search(query, pages))
             search_history.append(query)
-            if results:
-                for i, sentence in results:
-                    sentence = re.sub("\n", "", sentence)
-                    print_colored(f"Page {i + 1}:\n{sentence}\n", "green")
+        elif command == 'rs':
+            if search_history:
+                print_colored("Search History:", "blue")
+                for i, query in enumerate(search_history):
+                    print_colored(f"{i + 1}. {query}", "green")
+                try:
+                    search_choice = int(input_colored("Enter the number of the search query to run: ", "yellow").strip()) - 1
+                    if 0 <= search_choice < len(search_history):
+                        display_search_results(search_index.search(search_history[search_choice], pages))
+                    else:
+                        print_colored("Invalid search query choice.", "red")
+                except ValueError:
+                    print_colored("Invalid input. Please enter a number.", "red")
             else:
-                print_colored("No matches found.", "red")
+                print_colored("No search history available.", "yellow")
         elif command == 'q':
             print_colored("\nExiting program.", "magenta")
             break
         else:
             print_colored("Invalid command. Please try again.", "red")
 
-        page_lines = pages[page_number].split('\n')
-        progress = (line_offset / len(page_lines)) * 100 if len(page_lines) else 100
-        save_reading_session(book_id, page_number, line_offset, progress, bookmarks, search_history)
+        line_offset = get_page(pages, page_number).line_at(offset)
+        progress = (line_offset / pages.line_count(page_number)) * 100
+        session.update(page_number, line_offset, progress, bookmarks, search_history)
+        if warm_up is not None:
+            warm_up.resume()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+PROFILE_ENVIRONMENT_VARIABLE = "EPUB_READER_PROFILE"
+
+Event = Tuple[str, int, int, int, Optional[Dict[str, Any]]]
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'args', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str, args: Optional[Dict[str, Any]]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter_ns()
+        self.profiler.record(self.name, self.start, end - self.start, self.args)
+
+
+class Profiler:
+    def __init__(self, trace_path: Optional[str] = None) -> None:
+        self.trace_path = trace_path
+        self.events: List[Event] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def span(self, name: str, args: Optional[Dict[str, Any]] = None) -> _Span:
+        return _Span(self, name, args)
+
+    def record(self, name: str, start: int, duration: int, args: Optional[Dict[str, Any]] = None) -> None:
+        event = (name, start, duration, threading.get_ident(), args)
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self) -> List[Tuple[str, int, float, float, float]]:
+        durations: Dict[str, List[int]] = defaultdict(list)
+        with self._lock:
+            for name, _, duration, _, _ in self.events:
+                durations[name].append(duration)
+        rows = []
+        for name, values in durations.items():
+            total = sum(values) / 1e6
+            rows.append((name, len(values), total, total / len(values), max(values) / 1e6))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def print_summary(self, file: TextIO = sys.stderr) -> None:
+        print(f"\n{'span':<24} {'calls':>8} {'total ms':>12} {'mean ms':>10} {'max ms':>10}", file=file)
+        for name, calls, total, mean, maximum in self.summary():
+            print(f"{name:<24} {calls:>8} {total:>12.2f} {mean:>10.3f} {maximum:>10.3f}", file=file)
+        with self._lock:
+            counters = sorted(self.counters.items())
+        if counters:
+            print(f"\n{'counter':<24} {'value':>12}", file=file)
+            for name, value in counters:
+                print(f"{name:<24} {value:>12}", file=file)
+
+    def trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+        trace_events = []
+        for name, start, duration, thread, args in events:
+            event = {"name": name, "ph": "X", "ts": (start - self.origin) / 1000, "dur": duration / 1000,
+                     "pid": pid, "tid": thread}
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        end = (time.perf_counter_ns() - self.origin) / 1000
+        for name, value in counters.items():
+            trace_events.append({"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: value}})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.trace(), file)
+
+    def dump(self) -> None:
+        self.print_summary()
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+            print(f"\nTrace written to '{self.trace_path}'", file=sys.stderr)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def span(name: str, args: Optional[Dict[str, Any]] = None):
+    if _profiler is None:
+        return NULL_SPAN
+    return _Span(_profiler, name, args)
+
+
+def count(name: str, value: int = 1) -> None:
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def enable(trace_path: Optional[str] = None) -> Profiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(trace_path)
+        atexit.register(_profiler.dump)
+    elif trace_path:
+        _profiler.trace_path = trace_path
+    return _profiler
+
+
+def enable_from_environment() -> Optional[Profiler]:
+    value = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, "")
+    if not value or value == "0":
+        return None
+    return enable(None if value == "1" else value)
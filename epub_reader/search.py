@@ -0,0 +1,255 @@
+import bisect
+import math
+import marshal
+import os
+import re
+import zlib
+from array import array
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from epub_reader import profiling
+from epub_reader.book import page_text
+
+INDEX_VERSION = 1
+RESULT_CACHE_SIZE = 100
+
+_TOKEN_RE = re.compile(r'\w+')
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+class SearchHit(NamedTuple):
+    page: int
+    line: int
+    score: float
+    sentence: str
+    highlights: List[Tuple[int, int]]
+
+
+class QueryTerm(NamedTuple):
+    text: str
+    prefix: bool
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.casefold() for token in _TOKEN_RE.findall(text)]
+
+
+def parse_query(query: str) -> Tuple[List[QueryTerm], List[List[str]]]:
+    terms: List[QueryTerm] = []
+    phrases: List[List[str]] = []
+    for phrase, word in _QUERY_RE.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            terms.extend(QueryTerm(token, False) for token in tokens)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+        elif word:
+            prefix = word.endswith('*')
+            tokens = tokenize(word)
+            terms.extend(QueryTerm(token, prefix and i == len(tokens) - 1) for i, token in enumerate(tokens))
+            if len(tokens) > 1:
+                phrases.append(tokens)
+    return terms, phrases
+
+
+def index_page(text: str) -> Tuple[Dict[str, array], int]:
+    postings: Dict[str, array] = defaultdict(lambda: array('I'))
+    sentences = 0
+    for line_number, line in enumerate(text.split('\n')):
+        tokens = tokenize(line)
+        if tokens:
+            sentences += 1
+        for position, token in enumerate(tokens):
+            entry = postings[token]
+            entry.append(line_number)
+            entry.append(position)
+    return dict(postings), sentences
+
+
+class BookIndex:
+    def __init__(self, path: str, fingerprint: str, page_count: int) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self.page_count = page_count
+        self.pages: Dict[int, Dict[str, array]] = {}
+        self.sentences: Dict[int, int] = {}
+        self.results: 'OrderedDict[str, List[SearchHit]]' = OrderedDict()
+        self._vocabulary: Optional[List[str]] = None
+        self._dirty = False
+        self._results_dirty = False
+        self._load()
+        self._load_results()
+
+    @property
+    def results_path(self) -> str:
+        return f"{self.path}.results"
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, 'rb') as file:
+                data = marshal.loads(zlib.decompress(file.read()))
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None
+        if (not isinstance(data, dict) or data.get("version") != INDEX_VERSION
+                or data.get("fingerprint") != self.fingerprint or data.get("page_count") != self.page_count):
+            return None
+        return data
+
+    def _write(self, path: str, data: dict) -> None:
+        data.update(version=INDEX_VERSION, fingerprint=self.fingerprint, page_count=self.page_count)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as file:
+            file.write(zlib.compress(marshal.dumps(data), 6))
+        os.replace(temporary_path, path)
+
+    def _load(self) -> None:
+        data = self._read(self.path)
+        if data is None:
+            return
+        for page, postings in data["pages"].items():
+            entries = {}
+            for term, raw in postings.items():
+                entries[term] = array('I')
+                entries[term].frombytes(raw)
+            self.pages[page] = entries
+        self.sentences = data["sentences"]
+
+    def _load_results(self) -> None:
+        data = self._read(self.results_path)
+        if data is None:
+            return
+        for query, hits in data["results"]:
+            self.results[query] = [SearchHit(page, line, score, sentence, [tuple(span) for span in highlights])
+                                   for page, line, score, sentence, highlights in hits]
+
+    def save(self) -> None:
+        if self._dirty:
+            with profiling.span("index_write"):
+                self._write(self.path, {
+                    "pages": {page: {term: entry.tobytes() for term, entry in postings.items()}
+                              for page, postings in self.pages.items()},
+                    "sentences": self.sentences,
+                })
+            self._dirty = False
+        if self._results_dirty:
+            self._write(self.results_path, {
+                "results": [(query, [(hit.page, hit.line, hit.score, hit.sentence,
+                                      [list(span) for span in hit.highlights]) for hit in hits])
+                            for query, hits in self.results.items()],
+            })
+            self._results_dirty = False
+
+    @property
+    def complete(self) -> bool:
+        return len(self.pages) == self.page_count
+
+    def add_page(self, page_number: int, text: str) -> None:
+        if page_number in self.pages:
+            return
+        self.pages[page_number], self.sentences[page_number] = index_page(text)
+        self._vocabulary = None
+        if self.results:
+            self.results.clear()
+            self._results_dirty = True
+        self._dirty = True
+
+    def build(self, pages: Sequence[str]) -> None:
+        for page_number in range(self.page_count):
+            if page_number not in self.pages:
+                self.add_page(page_number, page_text(pages, page_number))
+
+    def vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted({term for postings in self.pages.values() for term in postings})
+        return self._vocabulary
+
+    def expand(self, term: QueryTerm) -> List[str]:
+        if not term.prefix:
+            return [term.text]
+        vocabulary = self.vocabulary()
+        start = bisect.bisect_left(vocabulary, term.text)
+        matches = []
+        for candidate in vocabulary[start:]:
+            if not candidate.startswith(term.text):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query: str, pages: Sequence[str], limit: Optional[int] = None) -> List[SearchHit]:
+        with profiling.span("search", {"query": query}):
+            return self._search(query, pages, limit)
+
+    def _search(self, query: str, pages: Sequence[str], limit: Optional[int] = None) -> List[SearchHit]:
+        key = ' '.join(query.split()).casefold()
+        if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key][:limit] if limit else self.results[key]
+        self.build(pages)
+        terms, phrases = parse_query(query)
+        hits = self._rank(terms, phrases, pages) if terms else []
+        self.results[key] = hits
+        while len(self.results) > RESULT_CACHE_SIZE:
+            self.results.popitem(last=False)
+        self._results_dirty = True
+        return hits[:limit] if limit else hits
+
+    def _rank(self, terms: List[QueryTerm], phrases: List[List[str]], pages: Sequence[str]) -> List[SearchHit]:
+        expansions = [self.expand(term) for term in terms]
+        if not all(expansions):
+            return []
+        total_sentences = max(1, sum(self.sentences.values()))
+        matches: Optional[Dict[Tuple[int, int], float]] = None
+        for words in expansions:
+            frequencies: Dict[Tuple[int, int], int] = defaultdict(int)
+            for page_number, postings in self.pages.items():
+                for word in words:
+                    entry = postings.get(word)
+                    if entry is None:
+                        continue
+                    for i in range(0, len(entry), 2):
+                        frequencies[(page_number, entry[i])] += 1
+            if not frequencies:
+                return []
+            idf = math.log(1 + total_sentences / len(frequencies))
+            scores = {key: (1 + math.log(count)) * idf for key, count in frequencies.items()}
+            if matches is None:
+                matches = scores
+            else:
+                matches = {key: matches[key] + score for key, score in scores.items() if key in matches}
+            if not matches:
+                return []
+
+        for phrase in phrases:
+            matches = {key: score * 2 for key, score in matches.items() if self._contains_phrase(key, phrase)}
+
+        prefixes = tuple(term.text for term in terms if term.prefix)
+        exact = {term.text for term in terms if not term.prefix}
+        hits = []
+        lines: List[str] = []
+        current_page = None
+        for (page_number, line_number), score in sorted(matches.items()):
+            if page_number != current_page:
+                lines, current_page = page_text(pages, page_number).split('\n'), page_number
+            sentence = lines[line_number]
+            highlights = [(match.start(), match.end()) for match in _TOKEN_RE.finditer(sentence)
+                          if match.group().casefold() in exact or (prefixes and match.group().casefold().startswith(prefixes))]
+            hits.append(SearchHit(page_number, line_number, round(score, 4), sentence, highlights))
+        hits.sort(key=lambda hit: (-hit.score, hit.page, hit.line))
+        return hits
+
+    def _contains_phrase(self, key: Tuple[int, int], phrase: List[str]) -> bool:
+        page_number, line_number = key
+        postings = self.pages[page_number]
+        positions: Optional[Set[int]] = None
+        for offset, word in enumerate(phrase):
+            entry = postings.get(word)
+            if entry is None:
+                return False
+            found = {entry[i + 1] - offset for i in range(0, len(entry), 2) if entry[i] == line_number}
+            positions = found if positions is None else positions & found
+            if not positions:
+                return False
+        return True
+
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from epub_reader import profiling
+
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".epub_reader")
+DEFAULT_DEBOUNCE = 2.0
+
+SessionState = Tuple[int, int, float, List[Tuple[int, float]], List[str]]
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_session_file(path: str) -> SessionState:
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            session_data = json.load(file)
+    except (OSError, ValueError):
+        return 0, 0, 0.0, [], []
+    return (
+        session_data.get("page_number", 0),
+        session_data.get("line_offset", 0),
+        session_data.get("progress", 0.0),
+        [tuple(bookmark) for bookmark in session_data.get("bookmarks", [])],
+        session_data.get("search_history", [])
+    )
+
+
+def session_data(state: SessionState) -> dict:
+    page_number, line_offset, progress, bookmarks, search_history = state
+    return {
+        "page_number": page_number,
+        "line_offset": line_offset,
+        "progress": progress,
+        "bookmarks": [list(bookmark) for bookmark in bookmarks],
+        "search_history": list(search_history)
+    }
+
+
+def clamp_state(state: SessionState, page_count: int) -> SessionState:
+    page_number, line_offset, progress, bookmarks, search_history = state
+    last_page = max(0, page_count - 1)
+    if not 0 <= page_number <= last_page:
+        page_number, line_offset, progress = min(max(0, page_number), last_page), 0, 0.0
+    bookmarks = [bookmark for bookmark in bookmarks if 0 <= bookmark[0] <= last_page]
+    return page_number, line_offset, progress, bookmarks, search_history
+
+
+def remap_state(state: SessionState, page_map: Dict[int, int]) -> SessionState:
+    page_number, line_offset, progress, bookmarks, search_history = state
+    if page_map.get(page_number, page_number) != page_number:
+        page_number, line_offset, progress = page_map[page_number], 0, 0.0
+    bookmarks = [(page_map.get(page, page), position) for page, position in bookmarks]
+    return page_number, line_offset, progress, bookmarks, search_history
+
+
+class SessionStore:
+    def __init__(self, book_id: str, legacy_id: Optional[str] = None, directory: str = SESSION_DIR,
+                 debounce: float = DEFAULT_DEBOUNCE, on_flush: Optional[Callable[[SessionState], None]] = None,
+                 legacy_page_map: Optional[Dict[int, int]] = None) -> None:
+        self.path = os.path.join(directory, f"{book_id}.json")
+        self.debounce = debounce
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._last_write = 0.0
+        if legacy_id and legacy_id != book_id and not os.path.exists(self.path):
+            self._migrate(os.path.join(directory, f"{legacy_id}.json"), legacy_page_map)
+        self.state: SessionState = read_session_file(self.path)
+        self._snapshot = session_data(self.state)
+
+    def _migrate(self, legacy_path: str, page_map: Optional[Dict[int, int]] = None) -> None:
+        if not os.path.exists(legacy_path):
+            return
+        state = read_session_file(legacy_path)
+        if page_map:
+            state = remap_state(state, page_map)
+        write_json_atomic(self.path, session_data(state))
+        try:
+            os.remove(legacy_path)
+        except OSError:
+            pass
+
+    def update(self, page_number: int, line_offset: int, progress: float,
+               bookmarks: List[Tuple[int, float]], search_history: List[str]) -> None:
+        state = (page_number, line_offset, progress, [tuple(bookmark) for bookmark in bookmarks], list(search_history))
+        snapshot = session_data(state)
+        with self._lock:
+            if snapshot == self._snapshot:
+                return
+            urgent = (snapshot["bookmarks"] != self._snapshot["bookmarks"]
+                      or snapshot["search_history"] != self._snapshot["search_history"])
+            self.state, self._snapshot, self._dirty = state, snapshot, True
+            if urgent or time.monotonic() - self._last_write >= self.debounce:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty:
+            return
+        with profiling.span("session_write"):
+            write_json_atomic(self.path, self._snapshot)
+        self._dirty = False
+        self._last_write = time.monotonic()
+        if self.on_flush is not None:
+            self.on_flush(self.state)
+
+    def close(self) -> None:
+        self.flush()
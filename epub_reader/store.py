@@ -0,0 +1,158 @@
+import mmap
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from epub_reader.book import Page
+
+DEFAULT_PAGE_CACHE_SIZE = 4
+
+
+class TextStore(Sequence):
+    __slots__ = ('buffer', 'chapter_offsets', 'chapter_lines', 'line_offsets', 'sentence_lines',
+                 'memory_budget', '_file', '_map', '_pages', '_page_cache_size')
+
+    def __init__(self, chapters: Iterable[str], memory_budget: Optional[int] = None,
+                 page_cache_size: int = DEFAULT_PAGE_CACHE_SIZE) -> None:
+        self.memory_budget = memory_budget
+        self.chapter_offsets = array('Q', [0])
+        self.chapter_lines = array('Q', [0])
+        self.line_offsets = array('I')
+        self.sentence_lines = array('I')
+        self._file: Optional[BinaryIO] = None
+        self._map: Optional[mmap.mmap] = None
+        self._pages: 'OrderedDict[int, Page]' = OrderedDict()
+        self._page_cache_size = max(1, page_cache_size)
+        pending = bytearray()
+        for text in chapters:
+            data = text.encode('utf-8')
+            self._index_chapter(data)
+            pending += data
+            if memory_budget is not None and self._file is None and len(pending) > memory_budget:
+                self._file = tempfile.TemporaryFile()
+            if self._file is not None:
+                self._file.write(pending)
+                pending = bytearray()
+        self.buffer = self._finish(pending)
+
+    def _index_chapter(self, data: bytes) -> None:
+        lines = self.line_offsets
+        sentences = self.sentence_lines
+        line = len(lines)
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            lines.append(start)
+            if (end if end != -1 else len(data)) > start:
+                sentences.append(line)
+            if end == -1:
+                break
+            line += 1
+            start = end + 1
+        self.chapter_offsets.append(self.chapter_offsets[-1] + len(data))
+        self.chapter_lines.append(len(lines))
+
+    def _finish(self, pending: bytearray) -> memoryview:
+        if self._file is None:
+            return memoryview(pending)
+        self._file.write(pending)
+        self._file.flush()
+        if not self.chapter_offsets[-1]:
+            return memoryview(b'')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    @property
+    def spilled(self) -> bool:
+        return self._map is not None
+
+    def __len__(self) -> int:
+        return len(self.chapter_offsets) - 1
+
+    def _check(self, index: int) -> int:
+        if not isinstance(index, int):
+            raise TypeError(f"chapter indices must be integers, not {type(index).__name__}")
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chapter index out of range")
+        return index
+
+    def _decode(self, start: int, end: int) -> str:
+        return str(self.buffer[start:end], 'utf-8')
+
+    def __getitem__(self, index: int) -> str:
+        index = self._check(index)
+        page = self._pages.get(index)
+        if page is not None:
+            return page.text
+        return self._decode(self.chapter_offsets[index], self.chapter_offsets[index + 1])
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def page(self, index: int, prefetch: bool = True) -> Page:
+        index = self._check(index)
+        page = self._pages.get(index)
+        if page is None:
+            page = self._pages[index] = Page(self[index])
+            while len(self._pages) > self._page_cache_size:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(index)
+        return page
+
+    def line_count(self, index: int) -> int:
+        index = self._check(index)
+        return self.chapter_lines[index + 1] - self.chapter_lines[index]
+
+    def line(self, index: int, line: int) -> str:
+        index = self._check(index)
+        first = self.chapter_lines[index]
+        if not 0 <= line < self.line_count(index):
+            raise IndexError("line index out of range")
+        base = self.chapter_offsets[index]
+        end = (self.line_offsets[first + line + 1] - 1 if first + line + 1 < self.chapter_lines[index + 1]
+               else self.chapter_offsets[index + 1] - base)
+        return self._decode(base + self.line_offsets[first + line], base + end)
+
+    def lines(self, index: int, start: int, end: int) -> List[str]:
+        return [self.line(index, line) for line in range(max(0, start), min(end, self.line_count(index)))]
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_lines)
+
+    def sentences(self, index: int) -> Iterator[str]:
+        index = self._check(index)
+        first, last = self.chapter_lines[index], self.chapter_lines[index + 1]
+        for position in range(bisect_left(self.sentence_lines, first), bisect_left(self.sentence_lines, last)):
+            yield self.line(index, self.sentence_lines[position] - first)
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.buffer) + self.chapter_offsets.itemsize * len(self.chapter_offsets)
+                + self.chapter_lines.itemsize * len(self.chapter_lines)
+                + self.line_offsets.itemsize * len(self.line_offsets)
+                + self.sentence_lines.itemsize * len(self.sentence_lines))
+
+    def close(self) -> None:
+        self._pages.clear()
+        self.buffer.release()
+        self.buffer = memoryview(b'')
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'TextStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
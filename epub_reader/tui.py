@@ -0,0 +1,371 @@
+import codecs
+import os
+import shutil
+import signal
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from epub_reader import profiling
+from epub_reader.book import LazyBook, get_page
+from epub_reader.layout import fit, layout_at, next_screen, pad, previous_screen
+from epub_reader.search import BookIndex, SearchHit
+from epub_reader.session import SessionStore, clamp_state
+from epub_reader.warmup import WarmUp
+
+try:
+    import termios
+    import tty
+    import select
+except ImportError:
+    termios = None
+    import msvcrt
+
+WARMUP_REFRESH = 0.5
+ESCAPE_TIMEOUT = 0.05
+
+RESET = "\033[0m"
+REVERSE = "\033[7m"
+CYAN = "\033[96m"
+GREEN = "\033[92m"
+YELLOW = "\033[93m"
+
+_KEYS = {
+    "\x1b[A": "up", "\x1b[B": "down", "\x1b[C": "right", "\x1b[D": "left",
+    "\x1bOA": "up", "\x1bOB": "down", "\x1bOC": "right", "\x1bOD": "left",
+    "\x1b[5~": "pageup", "\x1b[6~": "pagedown", "\x1b[H": "home", "\x1b[F": "end",
+    "\r": "enter", "\n": "enter", "\x7f": "backspace", "\x08": "backspace", "\x1b": "escape",
+}
+_WINDOWS_KEYS = {"H": "up", "P": "down", "M": "right", "K": "left", "I": "pageup", "Q": "pagedown", "G": "home", "O": "end"}
+
+
+class Terminal:
+    def __init__(self) -> None:
+        self.fd_in = sys.stdin.fileno()
+        self.fd_out = sys.stdout.fileno()
+        self.resized = False
+        self._saved_attributes = None
+        self._saved_handler = None
+        self._size = self.size()
+        self._pending = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def size(self) -> Tuple[int, int]:
+        columns, rows = shutil.get_terminal_size()
+        return max(1, columns), max(3, rows)
+
+    def __enter__(self) -> 'Terminal':
+        if termios is not None:
+            self._saved_attributes = termios.tcgetattr(self.fd_in)
+            tty.setcbreak(self.fd_in)
+            if hasattr(signal, "SIGWINCH"):
+                self._saved_handler = signal.signal(signal.SIGWINCH, self._on_resize)
+        self.write("\033[?1049h\033[?25l")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.write(f"{RESET}\033[?25h\033[?1049l")
+        if termios is not None:
+            termios.tcsetattr(self.fd_in, termios.TCSADRAIN, self._saved_attributes)
+            if self._saved_handler is not None:
+                signal.signal(signal.SIGWINCH, self._saved_handler)
+
+    def _on_resize(self, signum, frame) -> None:
+        self.resized = True
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8", errors="replace")
+        while data:
+            written = os.write(self.fd_out, data)
+            data = data[written:]
+
+    def _check_resize(self) -> bool:
+        if not self.resized and termios is None:
+            self.resized = self.size() != self._size
+        if self.resized:
+            self.resized = False
+            self._size = self.size()
+            return True
+        return False
+
+    def _next_key(self, complete: bool = False) -> Optional[str]:
+        if self._pending.startswith("\x1b"):
+            for length in (4, 3):
+                sequence = self._pending[:length]
+                if sequence in _KEYS:
+                    self._pending = self._pending[length:]
+                    return _KEYS[sequence]
+            if len(self._pending) == 1 and not complete:
+                return None
+            if len(self._pending) > 1 and self._pending[1] in "[O":
+                end = 2
+                while end < len(self._pending) and not self._pending[end].isalpha() and self._pending[end] != "~":
+                    end += 1
+                if end == len(self._pending) and not complete:
+                    return None
+                self._pending = self._pending[end + 1:]
+                return ""
+        key, self._pending = self._pending[0], self._pending[1:]
+        return _KEYS.get(key, key)
+
+    def read_key(self, timeout: Optional[float] = None) -> str:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._check_resize():
+                return "resize"
+            if deadline is not None and time.monotonic() >= deadline:
+                return ""
+            if termios is not None:
+                if self._pending:
+                    key = self._next_key()
+                    if key is not None:
+                        return key
+                ready, _, _ = select.select([self.fd_in], [], [], ESCAPE_TIMEOUT if self._pending else 0.1)
+                if not ready:
+                    if self._pending:
+                        return self._next_key(complete=True)
+                    continue
+                data = os.read(self.fd_in, 64)
+                if not data:
+                    return "q"
+                self._pending += self._decoder.decode(data)
+                continue
+            if not msvcrt.kbhit():
+                time.sleep(0.05)
+                continue
+            key = msvcrt.getwch()
+            if key in ("\x00", "\xe0"):
+                return _WINDOWS_KEYS.get(msvcrt.getwch(), "")
+            if key == "\x03":
+                raise KeyboardInterrupt
+            return _KEYS.get(key, key)
+
+
+class Screen:
+    def __init__(self, terminal: Terminal) -> None:
+        self.terminal = terminal
+        self._frame: List[str] = []
+
+    def invalidate(self) -> None:
+        self._frame = []
+
+    def draw(self, rows: List[str]) -> None:
+        buffer = []
+        if len(rows) != len(self._frame):
+            buffer.append("\033[2J")
+            self._frame = [None] * len(rows)
+        for number, row in enumerate(rows):
+            if row != self._frame[number]:
+                buffer.append(f"\033[{number + 1};1H{row}{RESET}\033[K")
+        self._frame = list(rows)
+        if buffer:
+            self.terminal.write("".join(buffer))
+
+
+class FullScreenReader:
+    def __init__(self, pages: LazyBook, session: SessionStore, search_index: BookIndex, title: str, author: str,
+                 warm_up: Optional[WarmUp] = None) -> None:
+        self.warm_up = warm_up
+        self.pages = pages
+        self.session = session
+        self.search_index = search_index
+        self.title = title
+        self.author = author
+        self.page_number, line_offset, _, bookmarks, search_history = clamp_state(session.state, len(pages))
+        self.offset = get_page(pages, self.page_number).offset_of(line_offset)
+        self.bookmarks = list(bookmarks)
+        self.search_history = list(search_history)
+        self.message = ""
+        self.terminal: Optional[Terminal] = None
+        self.screen: Optional[Screen] = None
+
+    @property
+    def body_height(self) -> int:
+        return self.terminal.size()[1] - 2
+
+    @property
+    def width(self) -> int:
+        return self.terminal.size()[0]
+
+    @property
+    def line_offset(self) -> int:
+        return get_page(self.pages, self.page_number).line_at(self.offset)
+
+    def go_to(self, page_number: int, line_offset: int) -> None:
+        self.page_number = page_number
+        self.offset = get_page(self.pages, page_number).offset_of(line_offset)
+
+    def progress(self) -> float:
+        return (self.line_offset / self.pages.line_count(self.page_number)) * 100
+
+    def save(self) -> None:
+        self.session.update(self.page_number, self.line_offset, self.progress(), self.bookmarks, self.search_history)
+
+    def run(self) -> None:
+        with Terminal() as terminal:
+            self.terminal = terminal
+            self.screen = Screen(terminal)
+            self.render()
+            if self.warm_up is not None:
+                self.warm_up.start()
+            while True:
+                key = terminal.read_key(timeout=WARMUP_REFRESH if self.warm_up is not None else None)
+                if key == "resize":
+                    self.screen.invalidate()
+                elif key in ("q", "Q"):
+                    break
+                elif key:
+                    if self.warm_up is not None:
+                        self.warm_up.pause()
+                    try:
+                        self.handle(key)
+                    finally:
+                        if self.warm_up is not None:
+                            self.warm_up.resume()
+                self.save()
+                self.render()
+
+    def frame(self) -> List[str]:
+        columns, rows = self.terminal.size()
+        height = rows - 2
+        layout = layout_at(self.pages, self.page_number, columns)
+        row = layout.row_at(self.offset)
+        body = layout.rows(row, row + height)
+        body.extend([""] * (height - len(body)))
+        status = (f" Page {self.page_number + 1}/{len(self.pages)} - {self.progress():.2f}%"
+                  f" (screen {row // max(1, height) + 1}/{layout.screen_count(height)}) | {self.title} by {self.author} ")
+        if self.warm_up is not None and self.warm_up.status():
+            status += f"| {self.warm_up.status()} "
+        hint = self.message or "n/p: next/previous  j: jump  s: search  b: bookmark  h: help  q: quit"
+        return body + [f"{REVERSE}{pad(status, columns)}", f"{CYAN}{fit(hint, columns)}"]
+
+    def render(self) -> None:
+        with profiling.span("render"):
+            self.screen.draw(self.frame())
+        self.message = ""
+
+    def scroll(self, rows: int) -> None:
+        layout = layout_at(self.pages, self.page_number, self.width)
+        row = min(max(0, layout.row_at(self.offset) + rows), len(layout) - 1)
+        self.offset = layout.row_starts[row]
+
+    def handle(self, key: str) -> None:
+        if key in ("n", " ", "right", "pagedown"):
+            self.page_number, self.offset = next_screen(self.pages, self.page_number, self.offset, self.width, self.body_height)
+        elif key in ("p", "left", "pageup"):
+            self.page_number, self.offset = previous_screen(self.pages, self.page_number, self.offset, self.width, self.body_height)
+        elif key == "down":
+            self.scroll(1)
+        elif key == "up":
+            self.scroll(-1)
+        elif key == "home":
+            self.offset = 0
+        elif key == "end":
+            layout = layout_at(self.pages, self.page_number, self.width)
+            self.offset = layout.row_starts[max(0, len(layout) - self.body_height)]
+        elif key == "j":
+            self.jump()
+        elif key in ("s", "/"):
+            self.search()
+        elif key == "b":
+            bookmark = (self.page_number, self.progress())
+            if bookmark not in self.bookmarks:
+                self.bookmarks.append(bookmark)
+            self.message = f"Bookmark added on page {self.page_number + 1} at {bookmark[1]:.2f}%"
+        elif key == "h":
+            self.show_help()
+
+    def prompt(self, label: str) -> Optional[str]:
+        text = ""
+        columns, rows = self.terminal.size()
+        while True:
+            self.terminal.write(f"\033[{rows};1H{YELLOW}{fit(label + text, columns)}{RESET}\033[K")
+            key = self.terminal.read_key()
+            if key == "enter":
+                break
+            if key == "escape":
+                text = None
+                break
+            if key == "backspace":
+                text = text[:-1]
+            elif key == "resize":
+                columns, rows = self.terminal.size()
+                self.screen.invalidate()
+                self.screen.draw(self.frame()[:-1] + [""])
+            elif len(key) == 1 and key.isprintable():
+                text += key
+        self.screen.invalidate()
+        return text
+
+    def jump(self) -> None:
+        answer = self.prompt("Jump to page: ")
+        if not answer:
+            return
+        try:
+            page_number = int(answer)
+        except ValueError:
+            self.message = "Invalid input. Please enter a number."
+            return
+        if 1 <= page_number <= len(self.pages):
+            self.page_number, self.offset = page_number - 1, 0
+        else:
+            self.message = f"Invalid page number. The EPUB has {len(self.pages)} pages."
+
+    def search(self) -> None:
+        query = self.prompt("Search: ")
+        if not query:
+            return
+        self.search_history.append(query)
+        hits = self.search_index.search(query, self.pages)
+        if not hits:
+            self.message = "No matches found."
+            return
+        self.show_results(hits)
+
+    def show_results(self, hits: List[SearchHit]) -> None:
+        top = 0
+        while True:
+            columns, rows = self.terminal.size()
+            height = rows - 2
+            body = []
+            for number, hit in enumerate(hits[top:top + height], start=top + 1):
+                label = f"{number:>4}. Page {hit.page + 1}:"
+                body.append(f"{GREEN}{label}{RESET} {fit(hit.sentence, max(0, columns - len(label) - 1))}")
+            body.extend([""] * (height - len(body)))
+            status = f" {len(hits)} matching sentences "
+            hint = "n/p: scroll  Enter: go to a result  q: back"
+            self.screen.draw(body + [f"{REVERSE}{pad(status, columns)}", f"{CYAN}{fit(hint, columns)}"])
+            key = self.terminal.read_key()
+            if key in ("n", " ", "pagedown", "down"):
+                top = min(top + height, max(0, len(hits) - 1))
+            elif key in ("p", "pageup", "up"):
+                top = max(0, top - height)
+            elif key == "enter":
+                answer = self.prompt("Result number: ")
+                if answer and answer.isdigit() and 1 <= int(answer) <= len(hits):
+                    hit = hits[int(answer) - 1]
+                    self.go_to(hit.page, hit.line)
+                    break
+            elif key == "resize":
+                self.screen.invalidate()
+            elif key in ("q", "escape"):
+                break
+
+    def show_help(self) -> None:
+        columns, rows = self.terminal.size()
+        lines = [
+            "n, space, right, PgDn   next screen",
+            "p, left, PgUp           previous screen",
+            "up, down                scroll one line",
+            "home, end               start or end of the page",
+            "j                       jump to page",
+            "s, /                    search",
+            "b                       add bookmark",
+            "h                       this help",
+            "q                       quit",
+        ]
+        body = [fit(line, columns) for line in lines][:rows - 1]
+        body.extend([""] * (rows - 1 - len(body)))
+        self.screen.draw(body + [f"{CYAN}{fit('Press any key to continue', columns)}"])
+        self.terminal.read_key()
+        self.screen.invalidate()
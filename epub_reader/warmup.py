@@ -0,0 +1,101 @@
+import threading
+import time
+import zipfile
+import zlib
+from typing import Callable, Iterator, Optional
+
+from epub_reader import profiling
+from epub_reader.book import LazyBook
+from epub_reader.search import BookIndex
+
+WARMUP_PAUSE = 0.01
+
+
+def _outward(start: int, count: int) -> Iterator[int]:
+    yield start
+    for distance in range(1, count):
+        for index in (start + distance, start - distance):
+            if 0 <= index < count:
+                yield index
+
+
+class WarmUp(threading.Thread):
+    def __init__(self, pages: LazyBook, search_index: Optional[BookIndex] = None, start_page: int = 0,
+                 on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        super().__init__(name='epub-warmup', daemon=True)
+        self.pages = pages
+        self.search_index = search_index
+        self.start_page = min(max(0, start_page), max(0, len(pages) - 1))
+        self.on_progress = on_progress
+        self.done = 0
+        self.total = len(pages)
+        self._resume = threading.Event()
+        self._resume.set()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopped = False
+
+    @property
+    def finished(self) -> bool:
+        return self.done >= self.total
+
+    @property
+    def progress(self) -> float:
+        return (self.done / self.total) * 100 if self.total else 100.0
+
+    def status(self) -> str:
+        if not self.is_alive() or self.finished:
+            return ""
+        return f"warming up {self.progress:.0f}%"
+
+    def pause(self) -> None:
+        self._resume.clear()
+        self._idle.wait()
+
+    def resume(self) -> None:
+        self._resume.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped = True
+        self._resume.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self) -> None:
+        with profiling.span("warmup"):
+            for index in _outward(self.start_page, self.total):
+                if not self._step(index):
+                    return
+            self._step(None)
+
+    def _step(self, index: Optional[int]) -> bool:
+        while True:
+            self._resume.wait()
+            if self._stopped:
+                return False
+            self._idle.clear()
+            if self._resume.is_set():
+                break
+            self._idle.set()
+        try:
+            text = None
+            try:
+                if index is None:
+                    self.pages.line_table()
+                else:
+                    text = self.pages.warm(index)
+            except (zipfile.BadZipFile, zlib.error, OSError, KeyError, ValueError):
+                pass
+            if index is None:
+                if self.search_index is not None:
+                    self.search_index.save()
+                return True
+            if text is not None and self.search_index is not None:
+                self.search_index.add_page(index, text)
+            self.done += 1
+        finally:
+            self._idle.set()
+        if self.on_progress is not None:
+            self.on_progress(self.done, self.total)
+        time.sleep(WARMUP_PAUSE)
+        return True
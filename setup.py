@@ -3,11 +3,14 @@ from setuptools import setup, find_packages
 setup(
     name='epub-reader',
     version='1.0.2',
-    packages=find_packages(),
+    packages=find_packages(exclude=('benchmarks', 'benchmarks.*')),
     include_package_data=True,
     install_requires=[
         'beautifulsoup4',
     ],
+    extras_require={
+        'lxml': ['lxml'],
+    },
     entry_points={
         'console_scripts': [
             'epub-reader=epub_reader.main:main',